@@ -1,90 +1,143 @@
+import http.client
 import socket
 import ssl
-import urllib.request
-import urllib.error
-from urllib.parse import urlparse
+import time
+from urllib.parse import urlparse, urljoin
 import dns.resolver
 
+from connection_pool import ConnectionPool, create_connection
+from dns_cache import DNSCache
+from result import CheckResult, Outcome
+
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECT_BODY = 64 * 1024
+BODY_CHUNK_SIZE = 16 * 1024
+
+def add_timing(result, field, seconds):
+    """Add a phase duration (in seconds) to result, which may be None"""
+    if result is not None:
+        result.add_timing(field, seconds)
+
+class CheckTimeout(Exception):
+    """Raised when a check runs past its deadline or is cancelled"""
+
 class WebsiteChecker:
     def __init__(self, config):
         self.config = config
         self.user_agent = config.get('user_agent')
+        self.connection_pool = ConnectionPool(config.get('http_pool_size'),
+                                              config.get('http_idle_timeout'))
+        self.dns_cache = DNSCache(config.get('dns_nameservers'), config.get('dns_max_ttl'))
+    
+    def remaining_time(self, deadline, cancel_event=None, limit=10):
+        """Seconds left for the next phase of a check, capped at limit.
+        
+        Raises CheckTimeout if the deadline has passed or the check was
+        cancelled, so abandoned checks stop between phases instead of
+        carrying on in the background.
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            raise CheckTimeout('Check cancelled')
+        if deadline is None:
+            return limit
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise CheckTimeout('Check deadline exceeded')
+        return min(limit, remaining)
     
-    def check_website(self, website):
-        """Check website with combined SSL and HTTP checks to reduce requests"""
+    def check_website(self, website, deadline=None, cancel_event=None):
+        """Check website with combined SSL and HTTP checks to reduce requests
+        
+        Returns a CheckResult, including the time spent in each phase.
+        
+        deadline is a time.monotonic() value; every network phase uses the
+        time left until then as its socket timeout.
+        """
+        result = CheckResult(website.get('id'))
+        self.run_checks(website, deadline, cancel_event, result)
+        return result
+    
+    def run_checks(self, website, deadline, cancel_event, result):
+        """Run the enabled checks in order, recording the first failure on result"""
         url = website['url']
         check_string = website.get('check_string', '')
         
         # Parse the URL to get components
         try:
-            parsed_url = urlparse(url)
-            hostname = parsed_url.netloc
-        except:
-            # Fallback if urlparse fails
+            hostname = urlparse(url).hostname
+        except ValueError:
+            hostname = None
+        if not hostname:
+            # Fallback if urlparse can't find a host (e.g. no scheme)
             hostname = url.split('//')[1].split('/')[0] if '//' in url else url.split('/')[0]
         
-        status = 'OK'
-        status_code = '200'
-        response_content = None
+        # Addresses from our own DNS check, so the connect step doesn't resolve again
+        addresses = None
+        string_found = None
+        
+        # Only look at the body when there is something to look for
+        needle = check_string if self.config.get('check_string') and check_string else None
         
         # Check DNS if enabled
         if self.config.get('check_dns'):
-            dns_status = self.check_dns(hostname)
+            start = time.perf_counter()
+            dns_status, addresses = self.check_dns(hostname, self.remaining_time(deadline, cancel_event))
+            result.add_timing('dns_ms', time.perf_counter() - start)
             if dns_status != 'OK':
-                return 'DNS', dns_status
+                result.outcome, result.error = Outcome.DNS, dns_status
+                return
         
         # Combined SSL and HTTP check
         if self.config.get('check_http'):
-            http_status, response_code, response_content = self.check_http(url)
-            
-            # If HTTPS URL and SSL check is enabled, interpret SSL errors properly
-            is_https = url.startswith('https://')
-            if is_https and self.config.get('check_ssl'):
-                if http_status.startswith('SSL') or ('SSL' in response_code):
-                    return 'SSL', response_code
+            outcome, http_code, error, string_found = self.check_http(
+                url, self.remaining_time(deadline, cancel_event), check_string=needle,
+                addresses=addresses, result=result, deadline=deadline, cancel_event=cancel_event)
             
-            if http_status != 'OK':
-                return 'HTTP', response_code
+            # SSL problems only count as SSL failures when the SSL check is enabled
+            if outcome == Outcome.SSL and not (url.startswith('https://') and self.config.get('check_ssl')):
+                outcome = Outcome.HTTP
             
-            status_code = response_code
+            result.outcome, result.http_code, result.error = outcome, http_code, error
+            if outcome != Outcome.OK:
+                return
         elif self.config.get('check_ssl') and url.startswith('https://'):
             # If only SSL check is enabled (not HTTP)
-            ssl_status = self.check_ssl(hostname)
+            ssl_status = self.check_ssl(hostname, self.remaining_time(deadline, cancel_event), addresses,
+                                        result)
             if ssl_status != 'OK':
-                return 'SSL', ssl_status
+                result.outcome, result.error = Outcome.SSL, ssl_status
+                return
         
         # Check for the expected string if needed
-        if self.config.get('check_string') and check_string and response_content:
-            if check_string not in response_content:
-                return 'String', 'Not Found'
-        
-        return status, status_code
+        if string_found is False:
+            result.outcome, result.error = Outcome.STRING, 'Not Found'
     
-    def check_dns(self, hostname):
+    def check_dns(self, hostname, timeout=10):
+        """Resolve hostname through the shared cache. Returns (status, addresses)"""
         try:
-            # Create a fresh resolver - don't mess with the cache
-            resolver = dns.resolver.Resolver()
-            
-            resolver.nameservers = ['8.8.8.8', '8.8.4.4']
-            
-            resolver.resolve(hostname)
-            return 'OK'
+            return 'OK', self.dns_cache.resolve(hostname, timeout)
         except dns.resolver.NXDOMAIN:
-            return 'Not Found'
+            return 'Not Found', None
         except dns.resolver.NoAnswer:
-            return 'No Answer'
+            return 'No Answer', None
         except dns.resolver.Timeout:
-            return 'Timeout'
+            return 'Timeout', None
         except Exception as e:
-            return str(e)
+            return str(e), None
     
-    def check_ssl(self, hostname):
+    def check_ssl(self, hostname, timeout=10, addresses=None, result=None):
         sock = None
         ssock = None
         try:
             context = ssl.create_default_context()
-            sock = socket.create_connection((hostname, 443))
+            start = time.perf_counter()
+            sock = create_connection(hostname, 443, timeout, addresses)
+            add_timing(result, 'connect_ms', time.perf_counter() - start)
+            
+            start = time.perf_counter()
             ssock = context.wrap_socket(sock, server_hostname=hostname)
+            add_timing(result, 'tls_ms', time.perf_counter() - start)
             cert = ssock.getpeercert()
             if cert:
                 return 'OK'
@@ -114,38 +167,216 @@ class WebsiteChecker:
                 except:
                     pass
     
-    def check_http(self, url):
-        """Make HTTP request and capture SSL errors separately if they occur"""
-        response = None
+    def check_http(self, url, timeout=10, fresh=False, check_string=None, addresses=None, result=None,
+                   deadline=None, cancel_event=None):
+        """Make HTTP request and capture SSL errors separately if they occur
+        
+        Returns (outcome, http_code, error, string_found). string_found is
+        None when no check_string was given, in which case the body isn't
+        downloaded.
+        
+        Connections come from the keep-alive pool unless http_keep_alive is
+        off or fresh=True, in which case a new connection is opened. New
+        connections dial the already resolved addresses when they are given.
+        Phase times and bytes read are added to result if one is passed in.
+        
+        Redirect hops and body reads stop at deadline or when cancel_event is
+        set, raising CheckTimeout.
+        """
+        fresh = fresh or not self.config.get('http_keep_alive')
         try:
-            headers = {'User-Agent': self.user_agent}
-            req = urllib.request.Request(url, headers=headers)
-            response = urllib.request.urlopen(req, timeout=10)
-            status_code = str(response.status)
-            content = response.read().decode('utf-8', errors='ignore')
+            status_code, string_found = self.fetch(url, timeout, fresh, check_string, addresses, result,
+                                                   deadline, cancel_event)
+            if status_code >= 300:
+                # Error codes, and redirects we gave up following
+                return Outcome.HTTP, status_code, None, None
             
-            return 'OK', status_code, content
-        except urllib.error.HTTPError as e:
-            return 'HTTP Error', str(e.code), None
-        except urllib.error.URLError as e:
-            # Check if it's an SSL-related error
-            error_str = str(e.reason).lower()
-            if 'ssl' in error_str or 'certificate' in error_str:
-                return 'SSL Error', str(e.reason), None
-            else:
-                return 'URL Error', str(e.reason), None
-        except ssl.SSLError as e:
-            return 'SSL Error', str(e), None
+            return Outcome.OK, status_code, None, string_found
+        except CheckTimeout:
+            raise
         except ssl.CertificateError as e:
-            return 'SSL Certificate Error', str(e), None
+            return Outcome.SSL, 0, str(e), None
+        except ssl.SSLError as e:
+            return Outcome.SSL, 0, str(e), None
         except socket.timeout:
-            return 'Timeout', 'Connection Timeout', None
+            return Outcome.HTTP, 0, 'Connection Timeout', None
+        except http.client.HTTPException as e:
+            return Outcome.HTTP, 0, str(e) or type(e).__name__, None
+        except OSError as e:
+            # DNS failures, refused connections and the like
+            error_str = str(e).lower()
+            if 'ssl' in error_str or 'certificate' in error_str:
+                return Outcome.SSL, 0, str(e), None
+            else:
+                return Outcome.HTTP, 0, str(e), None
         except Exception as e:
-            return 'Error', str(e), None
-        finally:
-            # Close the response if it exists
-            if response:
-                try:
-                    response.close()
-                except:
-                    pass
\ No newline at end of file
+            return Outcome.HTTP, 0, str(e), None
+    
+    def fetch(self, url, timeout=10, fresh=False, check_string=None, addresses=None, result=None,
+              deadline=None, cancel_event=None):
+        """GET a URL, following redirects, and return (status_code, string_found)"""
+        first_host = urlparse(url).hostname
+        for _ in range(MAX_REDIRECTS + 1):
+            # Every hop only gets what is left of the check's time
+            timeout = self.remaining_time(deadline, cancel_event, timeout)
+            parsed_url = urlparse(url)
+            scheme = parsed_url.scheme.lower()
+            if scheme not in ('http', 'https'):
+                raise ValueError(f"Unsupported URL scheme: {parsed_url.scheme}")
+            host = parsed_url.hostname
+            port = parsed_url.port or (443 if scheme == 'https' else 80)
+            path = parsed_url.path or '/'
+            if parsed_url.query:
+                path += '?' + parsed_url.query
+            
+            # Resolved addresses only apply to the original host, not redirect targets
+            host_addresses = addresses if host == first_host else None
+            response = self.request(scheme, host, port, path, timeout, fresh, host_addresses, result)
+            conn = response.connection
+            location = response.getheader('Location')
+            is_redirect = response.status in REDIRECT_CODES and location
+            string_found = None
+            start = time.perf_counter()
+            try:
+                if is_redirect:
+                    # Drain the (normally tiny) redirect body so the connection can be reused
+                    bytes_read = self.drain(response, MAX_REDIRECT_BODY, deadline, cancel_event, timeout)
+                elif check_string and response.status < 300:
+                    string_found, bytes_read = self.find_in_body(response, check_string,
+                                                                 deadline, cancel_event, timeout)
+                else:
+                    bytes_read = 0
+                if result is not None and (bytes_read or is_redirect or string_found is not None):
+                    result.add_timing('download_ms', time.perf_counter() - start)
+                    result.bytes_read += bytes_read
+                # The rest of a small body is cheaper to read than a new connection;
+                # large or unbounded (chunked, read-until-close) ones are dropped instead.
+                # It's connection upkeep, not part of the check, so it isn't measured
+                if (not fresh and not response.will_close and not response.isclosed()
+                        and response.length is not None and response.length <= MAX_REDIRECT_BODY):
+                    self.drain(response, response.length, deadline, cancel_event, timeout)
+            except Exception:
+                conn.close()
+                raise
+            
+            # Only a fully read response leaves the connection reusable
+            if response.will_close or fresh or not response.isclosed():
+                conn.close()
+            else:
+                self.connection_pool.put(scheme, host, port, conn)
+            
+            if is_redirect:
+                url = urljoin(url, location)
+                continue
+            
+            return response.status, string_found
+        
+        # Too many redirects - report it the way urllib did
+        return response.status, None
+    
+    def read_chunk(self, response, size, deadline=None, cancel_event=None, timeout=10):
+        """Read up to size bytes of whatever body has arrived.
+        
+        Checks the deadline before every read and gives the socket only the
+        time that is left, so a server trickling its body can't hold on to a
+        check thread past the check's deadline.
+        """
+        chunk = b''
+        if response.length != 0:
+            remaining = self.remaining_time(deadline, cancel_event, timeout)
+            if response.sock is not None:
+                response.sock.settimeout(remaining)
+            # read1 returns after a single socket read instead of waiting for size bytes
+            try:
+                chunk = response.read1(size)
+            except socket.timeout:
+                if remaining < timeout:
+                    raise CheckTimeout('Check deadline exceeded')
+                raise
+        if response.length == 0:
+            # Unlike read(), read1() doesn't mark the response finished at the
+            # end of a Content-Length body, which would keep it out of the pool
+            response.close()
+        return chunk
+    
+    def drain(self, response, limit, deadline=None, cancel_event=None, timeout=10):
+        """Read and discard up to limit bytes of body. Returns the number of bytes read"""
+        bytes_read = 0
+        while True:
+            chunk = self.read_chunk(response, min(BODY_CHUNK_SIZE, limit - bytes_read),
+                                    deadline, cancel_event, timeout)
+            if not chunk:
+                break
+            bytes_read += len(chunk)
+            if bytes_read >= limit:
+                break
+        return bytes_read
+    
+    def find_in_body(self, response, check_string, deadline=None, cancel_event=None, timeout=10):
+        """Stream the body and stop as soon as check_string turns up.
+        
+        Returns (found, bytes_read). Reading also stops after max_body_bytes,
+        in which case the string counts as not found. The last
+        len(check_string) - 1 bytes of each chunk are carried over so matches
+        across chunk boundaries are found.
+        """
+        needle = check_string.encode('utf-8')
+        limit = self.config.get('max_body_bytes')
+        carry = b''
+        bytes_read = 0
+        while bytes_read < limit:
+            chunk = self.read_chunk(response, min(BODY_CHUNK_SIZE, limit - bytes_read),
+                                    deadline, cancel_event, timeout)
+            if not chunk:
+                break
+            bytes_read += len(chunk)
+            window = carry + chunk
+            if needle in window:
+                return True, bytes_read
+            carry = window[-(len(needle) - 1):] if len(needle) > 1 else b''
+        return False, bytes_read
+    
+    def request(self, scheme, host, port, path, timeout, fresh, addresses=None, result=None):
+        """Send a GET and return the response with its connection attached"""
+        headers = {'User-Agent': self.user_agent, 'Accept-Encoding': 'identity'}
+        conn, reused = self.connection_pool.get(scheme, host, port, timeout, fresh, addresses)
+        try:
+            response = self.send(conn, path, headers, result)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped the idle connection - retry once on a new one
+            conn, _ = self.connection_pool.get(scheme, host, port, timeout, True, addresses)
+            try:
+                response = self.send(conn, path, headers, result)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        
+        response.connection = conn
+        return response
+    
+    def send(self, conn, path, headers, result=None):
+        """Send a GET on conn, timing the connect, TLS handshake and first byte"""
+        if conn.sock is None:
+            # New connection - open it ourselves so TCP and TLS can be timed apart
+            start = time.perf_counter()
+            conn.connect()
+            elapsed = time.perf_counter() - start
+            tcp_time = getattr(conn, 'tcp_connect_time', elapsed)
+            add_timing(result, 'connect_ms', tcp_time)
+            if isinstance(conn, http.client.HTTPSConnection):
+                add_timing(result, 'tls_ms', elapsed - tcp_time)
+        
+        start = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        # getresponse() drops conn.sock when the server will close, but the body is still read from it
+        sock = conn.sock
+        response = conn.getresponse()
+        response.sock = sock
+        add_timing(result, 'ttfb_ms', time.perf_counter() - start)
+        return response
\ No newline at end of file
@@ -6,6 +6,23 @@ class Config:
         self.config_file = config_file
         self.default_config = {
             'check_frequency': 300,  # seconds
+            'max_concurrent_checks': 20,  # checks in flight at once
+            'check_processes': 1,  # headless daemon only: shard checks over this many processes
+            'stagger_checks': True,  # spread checks across each site's interval
+            'check_jitter': 0.05,  # random delay, as a fraction of the interval, added to each check
+            'http_keep_alive': True,  # reuse connections between checks; off = fresh connection every time
+            'http_pool_size': 4,  # idle connections kept per host
+            'http_idle_timeout': 60,  # seconds before an idle connection is closed
+            'max_body_bytes': 5 * 1024 * 1024,  # stop looking for the check string after this much
+            'dns_nameservers': ['8.8.8.8', '8.8.4.4'],
+            'dns_max_ttl': 300,  # cache DNS answers for their TTL, but never longer than this
+            'write_batch_size': 200,  # check results written per transaction
+            'write_flush_ms': 500,  # longest a check result waits before being written
+            'probe_token': '',  # shared secret remote probes must present to the collector
+            'ui_refresh_ms': 100,  # check results reach the window in batches, at most one per interval
+            'compact_logs': False,  # True: one row per status change instead of one per check
+            'log_retention_days': 7,  # raw check logs; hourly/daily rollups outlive them
+            'hourly_rollup_days': 90,  # daily rollups are kept forever
             'check_dns': True,
             'check_ssl': True,
             'check_http': True,
@@ -0,0 +1,108 @@
+import http.client
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+
+def create_connection(host, port, timeout, addresses=None, source_address=None):
+    """Open a TCP connection, using pre-resolved addresses when we have them"""
+    if not addresses:
+        return socket.create_connection((host, port), timeout, source_address)
+    
+    last_error = None
+    for address in addresses:
+        try:
+            return socket.create_connection((address, port), timeout, source_address)
+        except OSError as e:
+            last_error = e
+    raise last_error
+
+class ConnectionPool:
+    """Keeps idle HTTP(S) connections open so repeat checks skip TCP/TLS setup.
+    
+    Connections are pooled per (scheme, host, port). A connection is handed
+    to one check at a time and goes back to the pool once its response has
+    been fully read. Idle connections are closed after idle_timeout seconds
+    and at most max_per_host idle connections are kept for any one host.
+    """
+    
+    def __init__(self, max_per_host=4, idle_timeout=60):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl.create_default_context()
+        self.idle = {}  # (scheme, host, port) -> deque of (connection, last_used)
+        self._lock = threading.Lock()
+    
+    def get(self, scheme, host, port, timeout, fresh=False, addresses=None):
+        """Return (connection, reused) for the given host.
+        
+        With fresh=True the pool is bypassed and a brand new connection is
+        returned, e.g. to measure cold-start behaviour. A new connection
+        dials the given pre-resolved addresses instead of resolving host.
+        """
+        key = (scheme, host, port)
+        if not fresh:
+            now = time.monotonic()
+            with self._lock:
+                connections = self.idle.get(key)
+                while connections:
+                    conn, last_used = connections.pop()
+                    if now - last_used < self.idle_timeout and conn.sock is not None:
+                        conn.timeout = timeout
+                        conn.sock.settimeout(timeout)
+                        return conn, True
+                    conn.close()
+        
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        
+        def connect(address, timeout, source_address=None):
+            # Dial pre-resolved addresses if we have them (TLS still verifies
+            # against host) and remember how long the TCP connect took
+            start = time.perf_counter()
+            sock = create_connection(host, address[1], timeout, addresses, source_address)
+            conn.tcp_connect_time = time.perf_counter() - start
+            return sock
+        
+        conn._create_connection = connect
+        return conn, False
+    
+    def put(self, scheme, host, port, conn):
+        """Hand a connection back after its response has been read"""
+        if conn.sock is None:
+            return
+        
+        key = (scheme, host, port)
+        now = time.monotonic()
+        with self._lock:
+            connections = self.idle.setdefault(key, deque())
+            self._expire(connections, now)
+            if len(connections) >= self.max_per_host:
+                conn.close()
+                return
+            connections.append((conn, now))
+    
+    def prune(self):
+        """Close every connection that has been idle for too long"""
+        now = time.monotonic()
+        with self._lock:
+            for key in list(self.idle):
+                self._expire(self.idle[key], now)
+                if not self.idle[key]:
+                    del self.idle[key]
+    
+    def close_all(self):
+        with self._lock:
+            for connections in self.idle.values():
+                for conn, _ in connections:
+                    conn.close()
+            self.idle.clear()
+    
+    def _expire(self, connections, now):
+        # Oldest connections sit at the left of the deque
+        while connections and now - connections[0][1] >= self.idle_timeout:
+            conn, _ = connections.popleft()
+            conn.close()
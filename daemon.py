@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# daemon.py - headless checker for machines without a display
+import argparse
+import logging
+import queue
+import signal
+import sys
+import threading
+import time
+
+from config import Config
+from database import Database
+from checker import WebsiteChecker
+from engine import CheckEngine
+from probe import Collector, SiteQuorum, parse_address
+from scheduler import CheckScheduler
+from shards import ShardPool
+from status_cache import StatusCache
+from writer import ResultWriter
+
+RELOAD_INTERVAL = 60  # seconds between re-reading the website list
+REPORT_INTERVAL = 10  # shortest gap between status report rewrites
+PRUNE_INTERVAL = 24 * 60 * 60
+
+class Daemon:
+    """Runs scheduled checks and stores their results without Qt.
+    
+    Same pipeline as the GUI: CheckScheduler decides what is due, CheckEngine
+    runs the checks and ResultWriter stores them in batches. Everything the
+    engine and writer threads report is passed back through one queue, so the
+    scheduler and status cache are only ever touched by the main thread.
+    
+    With processes > 1 the checks themselves move to a ShardPool of worker
+    processes, each scheduling its own share of the websites; this process
+    keeps the status cache and stays the only writer of the database.
+    
+    With a listen address it is also a collector: remote probes (probe.py)
+    connect, get their share of the websites and stream results back, which
+    are stored tagged with the probe's id. local_checks=False leaves all
+    the checking to the probes. Each site's state is then decided by a
+    SiteQuorum over the local checks and the probes.
+    
+    SIGTERM and SIGINT stop the daemon after writing what's queued; SIGHUP
+    re-reads the website list straight away.
+    """
+    
+    def __init__(self, config, database, checker, processes=1, listen=None, local_checks=True):
+        self.config = config
+        self.database = database
+        self.engine = CheckEngine(checker, config)
+        self.writer = ResultWriter(database, config.get('write_batch_size'),
+                                   config.get('write_flush_ms') / 1000)
+        self.scheduler = CheckScheduler(config.get('check_frequency'),
+                                        config.get('stagger_checks'),
+                                        config.get('check_jitter'))
+        self.status_cache = StatusCache()
+        self.events = queue.Queue()  # (kind, payload) from the engine and writer threads
+        self.pending_ids = set()  # websites queued or being checked
+        self.batches = 0  # one-off batches whose results aren't written yet
+        self.running = False
+        self.reload_requested = False
+        self.shard_pool = ShardPool(config, processes) if processes > 1 and local_checks else None
+        self.pump_thread = None
+        self.local_checks = local_checks
+        self.collector = None
+        self.quorum = None
+        if listen:
+            self.quorum = SiteQuorum()
+            self.collector = Collector(listen, self.on_probe_result, config.get('probe_token'),
+                                       self.quorum.forget)
+    
+    def load_websites(self, schedule=True):
+        websites = self.database.get_websites()
+        self.status_cache.load(websites)
+        if self.collector:
+            self.collector.assign(websites)
+        if not schedule or not self.local_checks:
+            pass
+        elif self.shard_pool:
+            self.shard_pool.assign(websites)
+        else:
+            self.scheduler.sync(websites)
+        logging.info(f"Loaded {len(websites)} websites")
+        return websites
+    
+    def check_once(self, websites):
+        if self.shard_pool:
+            self.batches = self.shard_pool.check_once(websites)
+        elif websites:
+            self.start_check(websites)
+            self.batches = 1
+    
+    def check_due(self):
+        # Worker processes and probes keep their own schedules
+        if self.local_checks and not self.shard_pool:
+            due_websites = self.scheduler.pop_due()
+            if due_websites:
+                self.start_check(due_websites)
+    
+    def start_shards(self):
+        self.shard_pool.start()
+        self.pump_thread = threading.Thread(target=self.pump_shard_results,
+                                            name='webby-shard-results', daemon=True)
+        self.pump_thread.start()
+        logging.info(f"Started {self.shard_pool.shards} check processes")
+    
+    def pump_shard_results(self):
+        """Pass worker results on to the writer and the main loop, like engine callbacks"""
+        while True:
+            message = self.shard_pool.results.get()
+            if message is None:
+                break
+            kind, payload = message
+            if kind == 'result':
+                self.store(payload[1])
+                self.events.put(message)
+            elif kind == 'done':
+                self.writer.after_flush(lambda: self.events.put(('written', None)))
+    
+    def start_check(self, websites):
+        """Queue a batch of checks; sites still being checked are left out"""
+        websites = [w for w in websites if w['id'] not in self.pending_ids]
+        if not websites:
+            return
+        self.pending_ids.update(w['id'] for w in websites)
+        
+        def on_result(website, result):
+            self.store(result)
+            self.events.put(('result', (website, result)))
+        
+        def on_done(successful_checks):
+            self.writer.after_flush(lambda: self.events.put(('written', None)))
+        
+        self.engine.check_batch(websites, on_result, on_result, on_done)
+    
+    def on_probe_result(self, website, result):
+        """Called from a collector connection thread, like an engine callback"""
+        self.store(result)
+        self.events.put(('result', (website, result)))
+    
+    def store(self, result):
+        """Queue a result for the writer, once the quorum has had its say"""
+        if self.quorum:
+            self.quorum.apply(result)
+        self.writer.put(result)
+    
+    def on_result(self, website, result):
+        if result.probe_id is None:
+            self.pending_ids.discard(website['id'])
+        if not result.sets_site_state:
+            return  # outvoted; stored for its own source only
+        cached = self.status_cache.get(result.website_id)
+        was_ok = cached is None or cached.get('status') in (None, 'OK')
+        if self.status_cache.apply(result) is None:
+            return
+        
+        # Only log changes of state; every check is in the database already
+        if was_ok and not result.ok:
+            logging.warning(f"{website['name']} ({website['url']}) is down: {result.status} "
+                            f"{result.status_code}{seen_from(result)}")
+        elif not was_ok and result.ok:
+            logging.info(f"{website['name']} ({website['url']}) is back up{seen_from(result)}")
+    
+    def handle_signal(self, sig, frame):
+        if sig == getattr(signal, 'SIGHUP', None):
+            self.reload_requested = True
+        else:
+            logging.info(f"Received signal {sig}, shutting down")
+            self.running = False
+        self.events.put(('wake', None))
+    
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.handle_signal)
+    
+    def run(self, once=False):
+        """Check websites as they fall due until stopped. Returns the exit code.
+        
+        With once=True every website is checked a single time and run()
+        returns when the results have been written.
+        """
+        self.writer.start()
+        if self.shard_pool:
+            self.start_shards()
+        if self.collector and not once:
+            self.collector.start()
+        self.running = True
+        websites = self.load_websites(schedule=not once)
+        if once:
+            self.check_once(websites)
+            self.running = self.batches > 0
+        
+        last_reload = last_prune = time.monotonic()
+        last_report = 0
+        report_due = False
+        try:
+            while self.running:
+                now = time.monotonic()
+                if not once:
+                    if self.reload_requested or now - last_reload >= RELOAD_INTERVAL:
+                        self.load_websites()
+                        self.reload_requested = False
+                        last_reload = now
+                    if now - last_prune >= PRUNE_INTERVAL:
+                        self.database.prune_old_logs(self.config.get('log_retention_days'),
+                                                     self.config.get('hourly_rollup_days'))
+                        last_prune = now
+                    self.check_due()
+                
+                if report_due and now - last_report >= REPORT_INTERVAL:
+                    self.database.generate_status_report()
+                    report_due = False
+                    last_report = now
+                
+                # Sleep until the next site is due, a result arrives or a signal wakes us
+                timeout = None if once else self.scheduler.seconds_until_next()
+                timeout = 1 if timeout is None else min(max(timeout, 0.05), 1)
+                try:
+                    kind, payload = self.events.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                while True:
+                    if kind == 'result':
+                        self.on_result(*payload)
+                    elif kind == 'written':
+                        report_due = True
+                        self.batches -= 1
+                        if once and self.batches <= 0:
+                            self.running = False
+                    try:
+                        kind, payload = self.events.get_nowait()
+                    except queue.Empty:
+                        break
+        finally:
+            self.shutdown()
+        return 0
+    
+    def shutdown(self):
+        """Cancel outstanding checks, then write everything that's queued"""
+        if self.collector:
+            self.collector.stop()
+        self.engine.shutdown()
+        if self.shard_pool:
+            self.shard_pool.stop()
+            if self.pump_thread:
+                # Everything the workers sent is ahead of this in the queue
+                self.shard_pool.results.put(None)
+                self.pump_thread.join()
+        self.writer.close()
+        self.database.generate_status_report()
+        self.database.close()
+        logging.info("Stopped")
+
+def seen_from(result):
+    return f" (probe {result.probe_id})" if result.probe_id else ''
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check websites without the GUI.")
+    parser.add_argument('--config', default='config.json', help="config file (default: config.json)")
+    parser.add_argument('--once', action='store_true',
+                        help="check every website once, write the results and exit")
+    parser.add_argument('--processes', type=int,
+                        help="check processes to shard the websites over (default: check_processes setting)")
+    parser.add_argument('--listen', metavar='HOST:PORT',
+                        help="collect results from remote probes (probe.py) on this address; "
+                             "the host defaults to 127.0.0.1 and probe_token must be set")
+    parser.add_argument('--no-local-checks', action='store_true',
+                        help="with --listen, leave all checking to the probes")
+    parser.add_argument('--log-file', help="log here instead of to stderr")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        filename=args.log_file
+    )
+    
+    config = Config(args.config)
+    database = Database(config.get('db_file'), config.get('compact_logs'))
+    processes = args.processes or config.get('check_processes')
+    if args.listen and not config.get('probe_token'):
+        parser.error("--listen needs a probe_token in the config, or anyone could send results")
+    listen = parse_address(args.listen) if args.listen else None
+    daemon = Daemon(config, database, WebsiteChecker(config), processes, listen,
+                    local_checks=not (listen and args.no_local_checks))
+    daemon.install_signal_handlers()
+    return daemon.run(once=args.once)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,180 +1,636 @@
 import sqlite3
+import threading
+import time
 from datetime import datetime
 import os
 
+import migrations
+from result import TIMING_FIELDS
+
+# Applied to every connection. WAL lets the GUI and report readers carry on
+# while a check result is being written; NORMAL sync is safe under WAL.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -8000',  # 8 MiB
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Compiled statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 128
+
+# Rollup table and bucket size in milliseconds for each resolution
+ROLLUPS = {
+    'hourly': ('rollup_hourly', migrations.HOUR_MS),
+    'daily': ('rollup_daily', migrations.DAY_MS),
+}
+
+# Gap between backfill batches, so check results don't queue up behind a long data migration
+BACKFILL_PAUSE = 0.05
+
+# CSV rows written per transaction by import_from_csv, and row errors kept for the report
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+
+class ImportReport:
+    """What import_from_csv did with each row of the file.
+    
+    True if the whole file was read, even when some rows were rejected.
+    Batches committed before a failure stay imported.
+    """
+    
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0  # URL already known (and unchanged, or updates were off)
+        self.error_count = 0
+        self.errors = []  # (line number, message), the first MAX_IMPORT_ERRORS of them
+        self.failure = None  # why the file couldn't be read to the end
+    
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append((line, message))
+    
+    def summary(self):
+        return (f"{self.inserted} added, {self.updated} updated, {self.skipped} already present, "
+                f"{self.error_count} invalid")
+    
+    def __bool__(self):
+        return self.failure is None
+
 class Database:
-    def __init__(self, db_file='uptime.db'):
+    """SQLite storage for websites and check logs.
+    
+    Each thread gets its own long-lived connection, opened on first use and
+    reused by every later call, so queries don't pay for connection setup
+    and the sqlite3 statement cache keeps them prepared.
+    
+    With compact_logs, check results go to status_runs - one row per
+    stretch of identical status with run-length counters - instead of one
+    logs row per check.
+    
+    Schema upgrades are made when the database is opened; converting the
+    existing data (timestamps, rollups, outages) carries on in batches on a
+    background thread. Until that finishes, history from before the upgrade
+    may be missing from the rollups and SLA figures.
+    """
+    
+    def __init__(self, db_file='uptime.db', compact_logs=False):
         self.db_file = db_file
+        self.compact_logs = compact_logs
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._backfill_thread = None
+        self._backfill_stop = threading.Event()
         self.init_db()
     
-    def init_db(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS websites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            url TEXT NOT NULL,
-            check_string TEXT,
-            last_check TIMESTAMP,
-            last_seen TIMESTAMP,
-            last_fail TIMESTAMP,
-            status TEXT,
-            status_code TEXT
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            website_id INTEGER,
-            timestamp TIMESTAMP,
-            status TEXT,
-            status_code TEXT,
-            FOREIGN KEY (website_id) REFERENCES websites (id)
-        )
-        ''')
+    def get_connection(self):
+        """Return this thread's connection, opening it if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, cached_statements=STATEMENT_CACHE_SIZE,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close every thread's connection; they reopen on the next query.
         
-        conn.commit()
-        conn.close()
+        A running backfill is stopped first and resumes when the database
+        is opened again.
+        """
+        if self._backfill_thread is not None:
+            self._backfill_stop.set()
+            self._backfill_thread.join()
+            self._backfill_thread = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    def init_db(self):
+        """Create the tables, or upgrade an older database to the current schema"""
+        conn = self.get_connection()
+        migrations.migrate(conn, backfill=False)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_websites_url_dup'").fetchone():
+            # Duplicate URLs kept the unique index out; try again in case they are gone
+            with conn:
+                migrations.unique_urls(conn)
+        if not migrations.pending_backfills(conn):
+            return
+        if conn.execute('SELECT 1 FROM logs LIMIT 1').fetchone() is None:
+            # Every backfill works from the logs, so a new database is done straight away
+            migrations.run_backfills(conn)
+        else:
+            self._backfill_stop.clear()
+            self._backfill_thread = threading.Thread(target=self._run_backfills,
+                                                     name='webby-backfill', daemon=True)
+            self._backfill_thread.start()
+    
+    def is_backfilling(self):
+        """True while data from before a schema upgrade is still being converted"""
+        return self._backfill_thread is not None and self._backfill_thread.is_alive()
+    
+    def _run_backfills(self):
+        try:
+            migrations.run_backfills(self.get_connection(), stop_event=self._backfill_stop,
+                                     pause=BACKFILL_PAUSE)
+        except sqlite3.Error as e:
+            # Retried from where it stopped the next time the database is opened
+            print(f"Error converting existing data: {str(e)}")
     
     def get_websites(self):
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('SELECT * FROM websites')
         websites = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
         return websites
     
     def get_website(self, website_id):
         """Get a single website by ID"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('SELECT * FROM websites WHERE id = ?', (website_id,))
         website = cursor.fetchone()
         
-        conn.close()
         return dict(website) if website else None
     
-    def add_website(self, name, url, check_string=''):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def add_website(self, name, url, check_string='', check_interval=None):
+        """Add a website. check_interval is in seconds; None uses the global check_frequency.
         
-        cursor.execute('''
-        INSERT INTO websites (name, url, check_string)
-        VALUES (?, ?, ?)
-        ''', (name, url, check_string))
+        Returns the new website's id, or False if a website with this URL already exists.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute('''
+                INSERT INTO websites (name, url, check_string, check_interval)
+                VALUES (?, ?, ?, ?)
+                ''', (name, url, check_string, check_interval))
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return False
+    
+    def update_website(self, website_id, name, url, check_string='', check_interval=None):
+        """Update a website's information. Returns False if another website has this URL"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute('''
+                UPDATE websites 
+                SET name = ?, url = ?, check_string = ?, check_interval = ?
+                WHERE id = ?
+                ''', (name, url, check_string, check_interval, website_id))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+    
+    def remove_website(self, website_id):
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM websites WHERE id = ?', (website_id,))
+            conn.execute('DELETE FROM logs WHERE website_id = ?', (website_id,))
+            conn.execute('DELETE FROM status_runs WHERE website_id = ?', (website_id,))
+            conn.execute('DELETE FROM outages WHERE website_id = ?', (website_id,))
+            for table, _ in ROLLUPS.values():
+                conn.execute(f'DELETE FROM {table} WHERE website_id = ?', (website_id,))
+    
+    def update_website_status(self, result):
+        """Record a CheckResult on its website and in the logs"""
+        self.write_results([result])
+    
+    def write_results(self, results):
+        """Record a batch of CheckResults in a single transaction.
         
-        conn.commit()
-        conn.close()
+        Logs and status runs are kept per probe. The website's own status,
+        rollups and outages (probe_id NULL) only take results with
+        sets_site_state, so probes that disagree don't flip the site back
+        and forth; each probe also gets outages of its own.
+        """
+        website_rows = []
+        log_rows = []
+        rollups = {resolution: {} for resolution in ROLLUPS}
+        transitions = []  # (ok, website_id, probe_id, timestamp) where a site may have gone up or down;
+                          # probe_id None for the site's own state
+        last_ok = {}
+        for result in results:
+            now = result.timestamp_ms
+            outcome = int(result.outcome)
+            if not self.compact_logs:
+                log_rows.append((result.website_id, now, result.status, result.status_code, outcome,
+                                 result.http_code, result.bytes_read, result.probe_id) +
+                                tuple(getattr(result, field) for field in TIMING_FIELDS))
+            
+            views = [] if result.probe_id is None else [result.probe_id]
+            if result.sets_site_state:
+                views.append(None)
+            for probe_id in views:
+                if last_ok.get((result.website_id, probe_id)) != result.ok:
+                    last_ok[result.website_id, probe_id] = result.ok
+                    transitions.append((result.ok, result.website_id, probe_id, now))
+            
+            if not result.sets_site_state:
+                continue
+            website_rows.append((now, now, result.status, result.status_code, outcome, result.http_code,
+                                 now if result.ok else None, None if result.ok else now,
+                                 result.website_id))
+            
+            latency = result.total_ms
+            for resolution, (_, size) in ROLLUPS.items():
+                key = (result.website_id, now - now % size)
+                totals = rollups[resolution].setdefault(key, [0, 0, 0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += not result.ok
+                if latency is not None:
+                    totals[2] += 1
+                    totals[3] += latency
+                    totals[4] = max(totals[4], latency)
+        
+        with self.get_connection() as conn:
+            conn.executemany('''
+            UPDATE websites 
+            SET first_check = COALESCE(first_check, ?), last_check = ?, status = ?,
+                status_code = ?, outcome = ?, http_code = ?,
+                last_seen = COALESCE(?, last_seen), last_fail = COALESCE(?, last_fail)
+            WHERE id = ?
+            ''', website_rows)
+            
+            if self.compact_logs:
+                self._write_status_runs(conn, results)
+            else:
+                conn.executemany('''
+                INSERT INTO logs (website_id, timestamp, status, status_code, outcome, http_code, bytes_read,
+                                  probe_id, dns_ms, connect_ms, tls_ms, ttfb_ms, download_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', log_rows)
+            
+            for resolution, (table, _) in ROLLUPS.items():
+                conn.executemany(f'''
+                INSERT INTO {table} (website_id, bucket, checks, failures,
+                                     latency_count, latency_sum, latency_max)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (website_id, bucket) DO UPDATE SET
+                    checks = checks + excluded.checks,
+                    failures = failures + excluded.failures,
+                    latency_count = latency_count + excluded.latency_count,
+                    latency_sum = latency_sum + excluded.latency_sum,
+                    latency_max = MAX(latency_max, excluded.latency_max)
+                ''', [key + tuple(totals) for key, totals in rollups[resolution].items()])
+            
+            # A failure opens an outage for its probe unless one is already
+            # open; the probe's next successful check closes it
+            for ok, website_id, probe_id, timestamp in transitions:
+                if ok:
+                    conn.execute("UPDATE outages SET ended = ? "
+                                 "WHERE website_id = ? AND IFNULL(probe_id, '') = ? AND ended IS NULL",
+                                 (timestamp, website_id, probe_id or ''))
+                else:
+                    conn.execute('INSERT OR IGNORE INTO outages (website_id, probe_id, started) '
+                                 'VALUES (?, ?, ?)', (website_id, probe_id, timestamp))
     
-    def update_website(self, website_id, name, url, check_string=''):
-        """Update a website's information"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def _write_status_runs(self, conn, results):
+        """Extend each site's current run while its status stays the same, start a new one when it changes.
+        
+        Every probe has its own runs, so probes that disagree don't break up each other's runs.
+        """
+        runs = {}  # (website_id, probe_id) -> [[status, status_code, outcome, http_code, first, last,
+                   #                             checks, latency_count, latency_min, latency_max,
+                   #                             latency_sum], ...]
+        for result in results:
+            site_runs = runs.setdefault((result.website_id, result.probe_id), [])
+            now = result.timestamp_ms
+            latency = result.total_ms
+            if site_runs and site_runs[-1][:2] == [result.status, result.status_code]:
+                run = site_runs[-1]
+                run[5] = now
+                run[6] += 1
+            else:
+                run = [result.status, result.status_code, int(result.outcome), result.http_code,
+                       now, now, 1, 0, None, None, 0.0]
+                site_runs.append(run)
+            if latency is not None:
+                run[7] += 1
+                run[8] = latency if run[8] is None else min(run[8], latency)
+                run[9] = latency if run[9] is None else max(run[9], latency)
+                run[10] += latency
+        
+        new_runs = []
+        for (website_id, probe_id), site_runs in runs.items():
+            status, status_code, _, _, _, last, checks, latency_count, latency_min, latency_max, \
+                latency_sum = site_runs[0]
+            cursor = conn.execute('''
+            UPDATE status_runs
+            SET last_check = ?, checks = checks + ?, latency_count = latency_count + ?,
+                latency_min = MIN(COALESCE(latency_min, ?), COALESCE(?, latency_min)),
+                latency_max = MAX(COALESCE(latency_max, ?), COALESCE(?, latency_max)),
+                latency_sum = latency_sum + ?
+            WHERE id = (SELECT MAX(id) FROM status_runs WHERE website_id = ? AND probe_id IS ?)
+              AND status IS ? AND status_code IS ?
+            ''', (last, checks, latency_count, latency_min, latency_min, latency_max, latency_max,
+                  latency_sum, website_id, probe_id, status, status_code))
+            
+            # The first run continues the stored one unless the status changed in between
+            start = 1 if cursor.rowcount else 0
+            new_runs.extend([website_id, probe_id] + run for run in site_runs[start:])
+        
+        conn.executemany('''
+        INSERT INTO status_runs (website_id, probe_id, status, status_code, outcome, http_code, first_check,
+                                 last_check, checks, latency_count, latency_min, latency_max, latency_sum)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', new_runs)
+    
+    def get_status_runs(self, website_id, since_ms, until_ms=None):
+        """A website's status history as runs of identical status, oldest first"""
+        if until_ms is None:
+            until_ms = int(time.time() * 1000)
+        cursor = self.get_connection().cursor()
         
         cursor.execute('''
-        UPDATE websites 
-        SET name = ?, url = ?, check_string = ?
-        WHERE id = ?
-        ''', (name, url, check_string, website_id))
+        SELECT * FROM status_runs
+        WHERE website_id = ? AND last_check >= ? AND first_check < ?
+        ORDER BY id
+        ''', (website_id, since_ms, until_ms))
         
-        conn.commit()
-        conn.close()
+        return [dict(row) for row in cursor.fetchall()]
     
-    def remove_website(self, website_id):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def get_probe_stats(self, since_ms, until_ms=None, website_id=None):
+        """Checks, failures and latency per probe, to compare what each location sees.
         
-        cursor.execute('DELETE FROM websites WHERE id = ?', (website_id,))
-        cursor.execute('DELETE FROM logs WHERE website_id = ?', (website_id,))
+        probe_id is None for checks run locally. With compact logs the counts
+        come from the status runs overlapping the period, so they are
+        accurate to the nearest run rather than the nearest check.
+        """
+        if until_ms is None:
+            until_ms = int(time.time() * 1000)
+        site_filter = '' if website_id is None else 'AND website_id = ?'
+        params = (since_ms, until_ms) + (() if website_id is None else (website_id,))
+        cursor = self.get_connection().cursor()
         
-        conn.commit()
-        conn.close()
+        if self.compact_logs:
+            cursor.execute(f'''
+            SELECT probe_id, SUM(checks) AS checks,
+                   SUM(CASE WHEN status != 'OK' THEN checks ELSE 0 END) AS failures,
+                   SUM(latency_sum) / NULLIF(SUM(latency_count), 0) AS avg_latency_ms,
+                   MIN(latency_min) AS min_latency_ms, MAX(latency_max) AS max_latency_ms
+            FROM status_runs
+            WHERE last_check >= ? AND first_check < ? {site_filter}
+            GROUP BY probe_id
+            ORDER BY probe_id
+            ''', params)
+        else:
+            # Same rule as CheckResult.total_ms: the phases that ran, NULL if none did
+            latency = ' + '.join(f'COALESCE({field}, 0)' for field in TIMING_FIELDS)
+            any_phase = ' OR '.join(f'{field} IS NOT NULL' for field in TIMING_FIELDS)
+            cursor.execute(f'''
+            SELECT probe_id, COUNT(*) AS checks,
+                   SUM(status != 'OK') AS failures,
+                   AVG(latency) AS avg_latency_ms,
+                   MIN(latency) AS min_latency_ms, MAX(latency) AS max_latency_ms
+            FROM (SELECT probe_id, status, CASE WHEN {any_phase} THEN {latency} END AS latency
+                  FROM logs
+                  WHERE timestamp >= ? AND timestamp < ? {site_filter})
+            GROUP BY probe_id
+            ORDER BY probe_id
+            ''', params)
+        
+        return [dict(row) for row in cursor.fetchall()]
     
-    def update_website_status(self, website_id, status, status_code):
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def get_rollups(self, website_id, since_ms, until_ms=None, resolution='hourly'):
+        """Per-bucket check counts and latency for a website, oldest first.
         
-        cursor.execute('''
-        UPDATE websites 
-        SET last_check = ?, status = ?, status_code = ?
-        WHERE id = ?
-        ''', (now, status, status_code, website_id))
+        resolution is 'hourly' or 'daily'; buckets are keyed by their start
+        in UTC epoch milliseconds. Buckets that overlap [since_ms, until_ms)
+        are included. Logs from before the rollups existed are only counted
+        once is_backfilling() is False.
+        """
+        table, size = ROLLUPS[resolution]
+        if until_ms is None:
+            until_ms = int(time.time() * 1000)
+        cursor = self.get_connection().cursor()
+        
+        cursor.execute(f'''
+        SELECT bucket, checks, failures, latency_count, latency_sum, latency_max
+        FROM {table}
+        WHERE website_id = ? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket
+        ''', (website_id, since_ms - since_ms % size, until_ms))
+        
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_uptime_summary(self, website_id, since_ms, until_ms=None, resolution='daily'):
+        """Uptime percentage and latency for a website over a period, from the rollups"""
+        rows = self.get_rollups(website_id, since_ms, until_ms, resolution)
+        checks = sum(row['checks'] for row in rows)
+        failures = sum(row['failures'] for row in rows)
+        latency_count = sum(row['latency_count'] for row in rows)
+        latency_sum = sum(row['latency_sum'] for row in rows)
         
-        if status == 'OK':
-            cursor.execute('UPDATE websites SET last_seen = ? WHERE id = ?', (now, website_id))
+        return {
+            'checks': checks,
+            'failures': failures,
+            'uptime_percent': 100.0 * (checks - failures) / checks if checks else None,
+            'avg_latency_ms': latency_sum / latency_count if latency_count else None,
+            'max_latency_ms': max((row['latency_max'] for row in rows if row['latency_count']), default=None),
+        }
+    
+    def get_sla(self, since_ms, until_ms=None, website_ids=None, probe_id=None):
+        """Uptime %, outages, MTTR and MTBF for each website over [since_ms, until_ms).
+        
+        Works from the outages table (one row per down period) in a single
+        pass, so the cost depends on the number of outages, not checks. A
+        site's window starts at its first recorded check if that is later
+        than since_ms. Returns {website_id: stats}; times are UTC epoch
+        milliseconds and durations are milliseconds. While is_backfilling()
+        the window only covers what has been converted so far.
+        
+        probe_id picks whose outages are used: None for the site's own
+        state (the local checks, or the probes' majority when there are
+        several sources), or a probe's id for what that probe saw.
+        """
+        if until_ms is None:
+            until_ms = int(time.time() * 1000)
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = None  # plain tuples; this loops over every outage
+        
+        if website_ids is None:
+            site_filter, params = '', ()
         else:
-            cursor.execute('UPDATE websites SET last_fail = ? WHERE id = ?', (now, website_id))
+            website_ids = list(website_ids)
+            site_filter = f"AND {{column}} IN ({', '.join('?' * len(website_ids))})"
+            params = tuple(website_ids)
         
-        cursor.execute('''
-        INSERT INTO logs (website_id, timestamp, status, status_code)
-        VALUES (?, ?, ?, ?)
-        ''', (website_id, now, status, status_code))
+        # When monitoring of each site began. Sites whose first check predates
+        # websites.first_check fall back to their oldest rollup bucket.
+        cursor.execute(f'''
+        SELECT id, first_check,
+               (SELECT MIN(bucket) FROM rollup_hourly WHERE website_id = w.id) AS first_hour,
+               (SELECT MIN(bucket) FROM rollup_daily WHERE website_id = w.id) AS first_day
+        FROM websites w
+        WHERE true {site_filter.format(column='id')}
+        ''', params)
+        stats = {}
+        for website_id, first_check, first_hour, first_day in cursor.fetchall():
+            if first_check is None:
+                # Hourly rollups are pruned sooner, so only trust them for the first day
+                first_check = first_hour if first_hour is not None and first_day is not None and \
+                    first_hour - first_hour % migrations.DAY_MS == first_day else first_day
+            start = max(since_ms, first_check) if first_check is not None else until_ms
+            stats[website_id] = {
+                'window_start': start,
+                'monitored_ms': max(0, until_ms - start),
+                'downtime_ms': 0,
+                'outages': [],  # (started, ended); ended is None while still down
+                'failures': 0,
+                '_repair_ms': [],
+            }
+        
+        cursor.execute(f'''
+        SELECT website_id, started, ended
+        FROM outages
+        WHERE started < ? AND (ended IS NULL OR ended > ?) AND probe_id IS ?
+              {site_filter.format(column='website_id')}
+        ORDER BY website_id, started
+        ''', (until_ms, since_ms, probe_id) + params)
+        for website_id, started, ended in cursor:
+            site = stats.get(website_id)
+            if site is None:
+                continue
+            clipped_start = max(started, site['window_start'])
+            clipped_end = min(ended, until_ms) if ended is not None else until_ms
+            if clipped_end <= clipped_start:
+                continue
+            site['downtime_ms'] += clipped_end - clipped_start
+            site['outages'].append((started, ended))
+            if started >= site['window_start']:
+                site['failures'] += 1
+            if ended is not None and ended <= until_ms:
+                site['_repair_ms'].append(ended - started)
+        
+        for site in stats.values():
+            repairs = site.pop('_repair_ms')
+            monitored = site['monitored_ms']
+            uptime = monitored - site['downtime_ms']
+            site['uptime_percent'] = 100.0 * uptime / monitored if monitored else None
+            site['mttr_ms'] = sum(repairs) / len(repairs) if repairs else None
+            site['mtbf_ms'] = uptime / site['failures'] if site['failures'] else None
         
-        conn.commit()
-        conn.close()
+        return stats
     
     def get_last_failure(self):
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
+        
+        if self.compact_logs:
+            cursor.execute('''
+            SELECT r.*, r.last_check AS timestamp, w.name, w.url
+            FROM status_runs r
+            JOIN websites w ON r.website_id = w.id
+            WHERE r.status != 'OK'
+            ORDER BY r.last_check DESC
+            LIMIT 1
+            ''')
+            result = cursor.fetchone()
+            return dict(result) if result else None
         
+        # Text sorts after every number, so "< ''" keeps out logs whose
+        # timestamps the background conversion hasn't reached yet
         cursor.execute('''
         SELECT l.*, w.name, w.url 
         FROM logs l
         JOIN websites w ON l.website_id = w.id
-        WHERE l.status != 'OK'
+        WHERE l.status != 'OK' AND l.timestamp < ''
         ORDER BY l.timestamp DESC
         LIMIT 1
         ''')
         
         result = cursor.fetchone()
-        conn.close()
         
         return dict(result) if result else None
     
-    def import_from_csv(self, csv_file):
+    def import_from_csv(self, csv_file, update_existing=False, batch_size=IMPORT_BATCH_SIZE):
+        """Add the websites in a name,url[,check_string] CSV file. Returns an ImportReport.
+        
+        The file is read as a stream and written batch_size rows per
+        transaction. URLs that are already known are skipped, or with
+        update_existing get the name and check string from the file.
+        Rows without a name or URL are reported and left out.
+        """
         import csv
         
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        report = ImportReport()
+        conn = self.get_connection()
+        # Without the unique URL index (duplicates in an old database) fall back to a lookup
+        unique_urls = any(index['name'] == 'idx_websites_url'
+                          for index in conn.execute('PRAGMA index_list(websites)'))
+        if unique_urls:
+            insert_sql = 'INSERT OR IGNORE INTO websites (name, url, check_string) VALUES (?, ?, ?)'
+        else:
+            insert_sql = '''
+            INSERT INTO websites (name, url, check_string)
+            SELECT ?1, ?2, ?3 WHERE NOT EXISTS (SELECT 1 FROM websites WHERE url = ?2)
+            '''
+        
+        def write_batch(batch):
+            rows = list(batch.values())
+            updated = 0
+            with conn:
+                if update_existing:
+                    # Only rows that actually change count as updated
+                    updated = conn.executemany('''
+                    UPDATE websites SET name = ?1, check_string = ?3
+                    WHERE url = ?2 AND (name IS NOT ?1 OR check_string IS NOT ?3)
+                    ''', rows).rowcount
+                inserted = conn.executemany(insert_sql, rows).rowcount
+            report.updated += updated
+            report.inserted += inserted
+            report.skipped += len(rows) - updated - inserted
+            batch.clear()
         
+        batch = {}  # url -> (name, url, check_string)
         try:
-            with open(csv_file, 'r') as f:
+            with open(csv_file, 'r', newline='') as f:
                 reader = csv.reader(f)
                 for row in reader:
-                    if len(row) >= 2:
-                        name, url = row[0], row[1]
-                        check_string = row[2] if len(row) > 2 else ''
-                        
-                        cursor.execute('SELECT id FROM websites WHERE url = ?', (url,))
-                        if not cursor.fetchone():
-                            cursor.execute('''
-                            INSERT INTO websites (name, url, check_string)
-                            VALUES (?, ?, ?)
-                            ''', (name, url, check_string))
-            
-            conn.commit()
-            return True
-        except Exception:
-            return False
-        finally:
-            conn.close()
-            
+                    if not any(field.strip() for field in row):
+                        continue  # blank line
+                    
+                    name = row[0].strip()
+                    url = row[1].strip() if len(row) > 1 else ''
+                    check_string = row[2] if len(row) > 2 else ''
+                    if not name or not url:
+                        report.add_error(reader.line_num, "expected name,url[,check_string]")
+                        continue
+                    
+                    if url in batch:
+                        # Repeated within the file: the last row wins when updating, the first otherwise
+                        report.skipped += 1
+                        if not update_existing:
+                            continue
+                        del batch[url]
+                    batch[url] = (name, url, check_string)
+                    if len(batch) >= batch_size:
+                        write_batch(batch)
+                
+                if batch:
+                    write_batch(batch)
+        except (OSError, UnicodeDecodeError, csv.Error, sqlite3.Error) as e:
+            report.failure = str(e)
+        
+        return report
+    
     def export_to_csv(self, csv_file):
         import csv
         
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         try:
             cursor.execute('SELECT name, url, check_string FROM websites')
@@ -188,56 +644,53 @@ class Database:
             return True
         except Exception:
             return False
-        finally:
-            conn.close()
 
     def get_current_status(self):
         """Get the current overall status of all websites"""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
-        # Check if any website is currently failing
-        cursor.execute('SELECT id, name, url, status, status_code, last_fail FROM websites WHERE status != "OK"')
-        failing_websites = cursor.fetchall()
+        # The most recently failing website, if any is failing (sites that
+        # never recorded a failure time sort last)
+        cursor.execute('''
+        SELECT id, name, url, status, status_code, outcome, http_code, last_fail
+        FROM websites
+        WHERE status != 'OK'
+        ORDER BY last_fail DESC
+        LIMIT 1
+        ''')
+        website = cursor.fetchone()
         
-        if failing_websites:
-            # Get the most recently failing website
-            most_recent = None
-            latest_time = None
-            
-            for website in failing_websites:
-                if website['last_fail']:
-                    site_time = datetime.strptime(website['last_fail'], '%Y-%m-%d %H:%M:%S')
-                    if latest_time is None or site_time > latest_time:
-                        latest_time = site_time
-                        most_recent = website
-            
-            conn.close()
-            return dict(most_recent) if most_recent else dict(failing_websites[0])
-        else:
-            conn.close()
-            return None
+        return dict(website) if website else None
 
-    def prune_old_logs(self, days=30):
-        """Delete logs older than specified days"""
-        conn = sqlite3.connect(self.db_file)
+    def prune_old_logs(self, days=30, hourly_days=None):
+        """Delete logs older than specified days.
+        
+        Hourly rollups older than hourly_days are deleted too, if given.
+        Daily rollups are kept for good. Logs are left alone while they are
+        still being converted, as the rollups and outages are built from them.
+        """
+        if self.is_backfilling():
+            return 0
+        
+        conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Calculate the date threshold
-        from datetime import datetime, timedelta
-        threshold_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        # Timestamps are UTC epoch milliseconds
+        now_ms = int(time.time() * 1000)
+        threshold = now_ms - days * migrations.DAY_MS
         
         try:
-            cursor.execute('DELETE FROM logs WHERE timestamp < ?', (threshold_date,))
+            cursor.execute('DELETE FROM logs WHERE timestamp < ?', (threshold,))
             deleted_count = cursor.rowcount
+            if hourly_days is not None:
+                cursor.execute('DELETE FROM rollup_hourly WHERE bucket < ?',
+                               (now_ms - hourly_days * migrations.DAY_MS,))
             conn.commit()
             return deleted_count
         except Exception as e:
+            conn.rollback()
             print(f"Error pruning logs: {str(e)}")
             return 0
-        finally:
-            conn.close()
 
 
     def backup_websites(self, backup_file='websites.csv'):
@@ -286,7 +739,10 @@ class Database:
             return False
 
     def generate_status_report(self, output_file='/tmp/webby_status.txt'):
-        """Generate a machine-readable status report file"""
+        """Generate a machine-readable status report file.
+        
+        last_seen and last_fail are UTC epoch milliseconds.
+        """
         try:
             websites = self.get_websites()
             with open(output_file, 'w') as f:
@@ -0,0 +1,97 @@
+import threading
+import time
+import dns.resolver
+
+MAX_ENTRIES = 10000
+
+class DNSCache:
+    """Shared, TTL-aware cache in front of one dnspython resolver.
+    
+    Answers are kept until their record TTL runs out (capped at max_ttl), so
+    many sites on the same domain cost a single lookup. NXDOMAIN/NoAnswer
+    results are cached for negative_ttl seconds; timeouts and other errors
+    are never cached. Concurrent lookups of the same name share one query.
+    """
+    
+    def __init__(self, nameservers=None, max_ttl=300, negative_ttl=30):
+        self.resolver = dns.resolver.Resolver()
+        if nameservers:
+            self.resolver.nameservers = list(nameservers)
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}  # hostname -> (expires, addresses, error)
+        self.pending = {}  # hostname -> threading.Event
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def resolve(self, hostname, timeout=10):
+        """Return the list of IPv4 addresses for hostname.
+        
+        Raises the same dnspython exceptions as Resolver.resolve().
+        """
+        hostname = hostname.lower().rstrip('.')
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                entry = self.entries.get(hostname)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return self._unpack(entry)
+                
+                event = self.pending.get(hostname)
+                if event is None:
+                    # We do the lookup; anyone else asking waits for us
+                    self.misses += 1
+                    event = threading.Event()
+                    self.pending[hostname] = event
+                    break
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not event.wait(remaining):
+                raise dns.resolver.LifetimeTimeout(timeout=timeout, errors=[])
+        
+        try:
+            entry = self._lookup(hostname, max(0.1, deadline - time.monotonic()))
+            with self._lock:
+                if len(self.entries) >= MAX_ENTRIES:
+                    self._expire()
+                self.entries[hostname] = entry
+        finally:
+            with self._lock:
+                del self.pending[hostname]
+            event.set()
+        
+        return self._unpack(entry)
+    
+    def _lookup(self, hostname, timeout):
+        """Query the resolver and build a cache entry for the answer"""
+        now = time.monotonic()
+        try:
+            answer = self.resolver.resolve(hostname, lifetime=timeout)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+            return (now + self.negative_ttl, None, e)
+        
+        ttl = min(self.max_ttl, answer.rrset.ttl)
+        addresses = [rdata.address for rdata in answer]
+        return (now + ttl, addresses, None)
+    
+    def _expire(self):
+        now = time.monotonic()
+        for hostname in [h for h, entry in self.entries.items() if entry[0] <= now]:
+            del self.entries[hostname]
+    
+    def _unpack(self, entry):
+        _, addresses, error = entry
+        if error is not None:
+            raise error
+        return addresses
+    
+    def get_stats(self):
+        """Cache counters: hits, misses and the number of cached names"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+    
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
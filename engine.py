@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from checker import CheckTimeout
+from result import CheckResult, Outcome
+
+class CheckEngine:
+    """Runs website checks concurrently on a long-lived asyncio event loop.
+    
+    The checks themselves are blocking (urllib, dnspython), so each one runs
+    on a bounded pool of worker threads that lives as long as the engine.
+    The pool size is the hard cap on live check threads; at most
+    `max_concurrent_checks` checks are in flight at any time and anything
+    beyond that waits in the queue instead of starting another thread.
+    A cycle takes as long as its slowest site instead of the sum of all sites.
+    """
+    
+    def __init__(self, checker, config):
+        self.checker = checker
+        self.config = config
+        self.executor = None
+        self.pool_size = 0
+        self.loop = None
+        self.loop_thread = None
+        self.semaphore = None
+        self.in_flight = {}  # website id -> Future
+        self.batches = set()
+        self._lock = threading.Lock()
+    
+    def get_timeout(self, website=None):
+        interval = (website or {}).get('check_interval') or self.config.get('check_frequency')
+        return min(30, interval / 2)
+    
+    def get_pool_size(self):
+        return max(1, int(self.config.get('max_concurrent_checks')))
+    
+    def start(self):
+        """Start the event loop thread and worker pool if they aren't running"""
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever,
+                                                    name='webby-engine', daemon=True)
+                self.loop_thread.start()
+            
+            pool_size = self.get_pool_size()
+            if self.executor is None or pool_size != self.pool_size:
+                # Pool size changed in settings - let the old pool drain on its own
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+                self.executor = ThreadPoolExecutor(max_workers=pool_size,
+                                                   thread_name_prefix='webby-check')
+                self.pool_size = pool_size
+                self.semaphore = None  # recreated on the loop with the new limit
+    
+    def submit(self, website):
+        """Queue a single check and return a Future for its result.
+        
+        The future resolves to the CheckResult for exactly this website, or
+        raises CheckTimeout if the check ran out of time.
+        Cancelling the future drops the check if it hasn't started yet and
+        makes a running check give up at its next phase.
+        """
+        self.start()
+        deadline = time.monotonic() + self.get_timeout(website)
+        cancel_event = threading.Event()
+        future = self.executor.submit(self._do_check, website, deadline, cancel_event)
+        future.cancel_event = cancel_event
+        
+        website_id = website.get('id')
+        self.in_flight[website_id] = future
+        future.add_done_callback(lambda f: self._forget(website_id, f))
+        return future
+    
+    def check_batch(self, websites, on_result, on_error, on_done=None):
+        """Check a batch of websites without blocking the caller.
+        
+        on_result(website, result) and on_error(website, result) are called
+        from the engine thread with a CheckResult as each check completes, and
+        on_done(successful_checks) once the whole batch has finished.
+        Returns a Future for the number of successful checks.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(
+            self._run_batch(websites, on_result, on_error, on_done), self.loop)
+    
+    def run(self, websites, on_result, on_error):
+        """Check all websites and block until every check has finished"""
+        return self.check_batch(websites, on_result, on_error).result()
+    
+    def stop(self):
+        """Cancel every batch and check that is still queued or running"""
+        if self.loop is not None:
+            for task in list(self.batches):
+                self.loop.call_soon_threadsafe(task.cancel)
+        for future in list(self.in_flight.values()):
+            future.cancel_event.set()
+            future.cancel()
+    
+    def shutdown(self):
+        self.stop()
+        if self.loop is not None:
+            # Let the cancelled batches unwind before the loop goes away
+            try:
+                asyncio.run_coroutine_threadsafe(self._drain(1), self.loop).result(2)
+            except Exception:
+                pass
+        with self._lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop_thread.join(5)
+                self.loop = None
+        self.checker.connection_pool.close_all()
+    
+    async def _drain(self, timeout):
+        if self.batches:
+            await asyncio.wait(list(self.batches), timeout=timeout)
+    
+    def _forget(self, website_id, future):
+        if self.in_flight.get(website_id) is future:
+            del self.in_flight[website_id]
+    
+    def _do_check(self, website, deadline, cancel_event):
+        return self.checker.check_website(website, deadline=deadline, cancel_event=cancel_event)
+    
+    async def _run_batch(self, websites, on_result, on_error, on_done):
+        # Connections to hosts that aren't checked any more would otherwise
+        # only be closed when the same host is used again
+        self.checker.connection_pool.prune()
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+        semaphore = self.semaphore
+        
+        task = asyncio.current_task()
+        self.batches.add(task)
+        successful_checks = 0
+        try:
+            results = await asyncio.gather(
+                *[self._check_one(website, semaphore, on_result, on_error) for website in websites])
+            successful_checks = sum(1 for ok in results if ok)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.batches.discard(task)
+            if on_done:
+                on_done(successful_checks)
+        return successful_checks
+    
+    async def _check_one(self, website, semaphore, on_result, on_error):
+        async with semaphore:
+            future = self.submit(website)
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.wrap_future(future), self.get_timeout(website))
+            except (asyncio.TimeoutError, CheckTimeout):
+                # Dropped from the queue if it never started, otherwise the
+                # check stops at its deadline instead of running on forever
+                future.cancel_event.set()
+                future.cancel()
+                on_error(website, CheckResult(website.get('id'), Outcome.TIMEOUT,
+                                              error="Checker timeout"))
+                return False
+            except (asyncio.CancelledError, CancelledError):
+                future.cancel_event.set()
+                future.cancel()
+                raise
+            except Exception as e:
+                # The check itself blew up - report it as an Error status
+                result = CheckResult(website.get('id'), Outcome.ERROR, error=str(e))
+            
+            on_result(website, result)
+            return True
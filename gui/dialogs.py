@@ -13,22 +13,27 @@ class AddSiteDialog(QDialog):
         self.name_input = QLineEdit()
         self.url_input = QLineEdit()
         self.string_input = QLineEdit()
+        self.interval_input = QLineEdit()
+        self.interval_input.setPlaceholderText("Default")
         
         # Pre-fill fields if editing an existing website
         if website:
             self.name_input.setText(website.get('name', ''))
             self.url_input.setText(website.get('url', ''))
             self.string_input.setText(website.get('check_string', ''))
+            if website.get('check_interval'):
+                self.interval_input.setText(str(website['check_interval']))
         
         layout.addRow("Friendly Name:", self.name_input)
         layout.addRow("URL:", self.url_input)
         layout.addRow("String to Check:", self.string_input)
+        layout.addRow("Check Interval (seconds):", self.interval_input)
         
         buttons_layout = QHBoxLayout()
         self.ok_button = QPushButton("OK")
         self.cancel_button = QPushButton("Cancel")
         
-        self.ok_button.clicked.connect(self.accept)
+        self.ok_button.clicked.connect(self.validate_and_accept)
         self.cancel_button.clicked.connect(self.reject)
         
         buttons_layout.addWidget(self.ok_button)
@@ -37,11 +42,20 @@ class AddSiteDialog(QDialog):
         layout.addRow("", buttons_layout)
         self.setLayout(layout)
     
+    def validate_and_accept(self):
+        interval = self.interval_input.text().strip()
+        if interval and (not interval.isdigit() or int(interval) < 1):
+            QMessageBox.warning(self, "Invalid Setting", "Check interval must be a positive number of seconds.")
+            return
+        self.accept()
+    
     def get_values(self):
+        interval = self.interval_input.text().strip()
         return {
             'name': self.name_input.text(),
             'url': self.url_input.text(),
-            'check_string': self.string_input.text()
+            'check_string': self.string_input.text(),
+            'check_interval': int(interval) if interval else None
         }
 
 class SettingsDialog(QDialog):
@@ -54,7 +68,10 @@ class SettingsDialog(QDialog):
         layout = QFormLayout()
         
         self.frequency_input = QLineEdit(str(config.get('check_frequency')))
-        layout.addRow("Check Frequency (seconds):", self.frequency_input)
+        layout.addRow("Default Check Frequency (seconds):", self.frequency_input)
+        
+        self.concurrency_input = QLineEdit(str(config.get('max_concurrent_checks')))
+        layout.addRow("Concurrent Checks:", self.concurrency_input)
         
         self.dns_check = QPushButton("On" if config.get('check_dns') else "Off")
         self.dns_check.clicked.connect(lambda: self.toggle_button(self.dns_check))
@@ -72,6 +89,11 @@ class SettingsDialog(QDialog):
         self.string_check.clicked.connect(lambda: self.toggle_button(self.string_check))
         layout.addRow("Check String:", self.string_check)
         
+        # Spread checks across the interval instead of running them all at once
+        self.stagger_check = QPushButton("On" if config.get('stagger_checks') else "Off")
+        self.stagger_check.clicked.connect(lambda: self.toggle_button(self.stagger_check))
+        layout.addRow("Stagger Checks:", self.stagger_check)
+        
         # Add dark mode toggle
         self.dark_mode = QPushButton("On" if config.get('dark_mode') else "Off")
         self.dark_mode.clicked.connect(lambda: self.toggle_button(self.dark_mode))
@@ -102,11 +124,17 @@ class SettingsDialog(QDialog):
             if frequency < 1:
                 raise ValueError("Frequency must be positive")
             
+            concurrency = int(self.concurrency_input.text())
+            if concurrency < 1:
+                raise ValueError("Concurrent checks must be positive")
+            
             self.config.set('check_frequency', frequency)
+            self.config.set('max_concurrent_checks', concurrency)
             self.config.set('check_dns', self.dns_check.text() == "On")
             self.config.set('check_ssl', self.ssl_check.text() == "On")
             self.config.set('check_http', self.http_check.text() == "On")
             self.config.set('check_string', self.string_check.text() == "On")
+            self.config.set('stagger_checks', self.stagger_check.text() == "On")
             self.config.set('dark_mode', self.dark_mode.text() == "On")
             
             self.accept()
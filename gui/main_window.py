@@ -1,12 +1,14 @@
 import sys
 from datetime import datetime
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                            QTableWidgetItem, QHeaderView, QLabel, QAction, QStatusBar)
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                            QAbstractItemView, QHeaderView, QLabel, QAction, QStatusBar)
 from PyQt5.QtGui import QPixmap, QIcon
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, QSize, pyqtSignal
 
 from gui.dialogs import AddSiteDialog, SettingsDialog, AboutDialog
 from gui.styles import LIGHT_STYLE, DARK_STYLE
+from gui.website_model import WebsiteTableModel
+from status_cache import StatusCache
 
 from PyQt5.QtCore import pyqtSlot  # Add this import
 
@@ -23,6 +25,9 @@ class MainWindow(QMainWindow):
         # Add cache for website data
         self.websites_cache = []
         
+        # Current status of every site, kept up to date from check results
+        self.status_cache = StatusCache()
+        
         self.setWindowTitle("Webby - Website Uptime Checker")
         self.setMinimumSize(800, 600)
         
@@ -70,14 +75,20 @@ class MainWindow(QMainWindow):
         
         main_layout.addLayout(header_layout)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Status", "Name", "URL", "Last Seen", "Last Fail"])
+        # Model/view table: cells are computed on demand for the visible rows only
+        self.website_model = WebsiteTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.website_model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setIconSize(QSize(24, 24))
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
+        # Size columns from the visible rows rather than scanning the whole model
+        self.table.horizontalHeader().setResizeContentsPrecision(0)
         
         # Add padding to Name column cells
         self.table.setStyleSheet("QTableView::item { padding-right: 15px; }")
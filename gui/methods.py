@@ -4,22 +4,27 @@ from gui.main_window import MainWindow
 # Import modules from refactored files
 from gui.utils import format_time_since, get_short_status_code
 from gui.ui_handlers import (
-    setup_timers, update_time, update_table_times, 
-    load_websites, update_table_row
+    load_status_images, setup_timers, update_time, update_table_times, 
+    load_websites, update_table_row, add_website_row, replace_website_row, remove_website_row
 )
 from gui.website_handlers import (
-    check_websites, refresh_websites, add_site, edit_site, 
+    check_websites, check_due_websites, refresh_websites, add_site, edit_site, 
     remove_site, import_from_csv, export_to_csv, 
     show_settings, show_about,
-    on_checking_started, on_website_checked, on_website_error, on_checking_complete
+    on_checking_started, on_results_checked, on_checking_complete, write_status_report
 )
 
 # Add all the handler methods to the MainWindow class
+MainWindow.load_status_images = load_status_images
 MainWindow.setup_timers = setup_timers
 MainWindow.update_time = update_time
 MainWindow.load_websites = load_websites
 MainWindow.update_table_row = update_table_row
+MainWindow.add_website_row = add_website_row
+MainWindow.replace_website_row = replace_website_row
+MainWindow.remove_website_row = remove_website_row
 MainWindow.check_websites = check_websites
+MainWindow.check_due_websites = check_due_websites
 MainWindow.refresh_websites = refresh_websites
 MainWindow.add_site = add_site
 MainWindow.edit_site = edit_site
@@ -30,9 +35,9 @@ MainWindow.show_settings = show_settings
 MainWindow.show_about = show_about
 MainWindow.update_table_times = update_table_times
 MainWindow.on_checking_started = on_checking_started
-MainWindow.on_website_checked = on_website_checked
-MainWindow.on_website_error = on_website_error
+MainWindow.on_results_checked = on_results_checked
 MainWindow.on_checking_complete = on_checking_complete
+MainWindow.write_status_report = write_status_report
 # The apply_theme method is already defined in main_window.py
 
 def emergency_save(self):
@@ -41,8 +46,12 @@ def emergency_save(self):
         from datetime import datetime
         
         # Try to gracefully terminate any running checks
-        if hasattr(self, 'threaded_checker') and self.threaded_checker.is_running():
-            self.threaded_checker.stop_check()
+        if hasattr(self, 'threaded_checker'):
+            if self.threaded_checker.is_running():
+                self.threaded_checker.stop_check()
+            
+            # Get results that are still queued into the database
+            self.threaded_checker.flush(timeout=5)
         
         # Export websites list if possible
         emergency_csv = "emergency_backup.csv"
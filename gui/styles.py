@@ -4,7 +4,7 @@ QMainWindow, QDialog {
     background-color: #f0f0f0;
     color: #202020;
 }
-QTableWidget {
+QTableView {
     background-color: white;
     alternate-background-color: #f9f9f9;
     color: black;
@@ -65,7 +65,7 @@ QMainWindow, QDialog {
     background-color: #2d2d2d;
     color: #e0e0e0;
 }
-QTableWidget {
+QTableView {
     background-color: #3c3c3c;
     alternate-background-color: #353535;
     color: #e0e0e0;
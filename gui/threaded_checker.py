@@ -1,91 +1,78 @@
-import time
+import math
 import threading
-from datetime import datetime
-from PyQt5.QtCore import QObject, pyqtSignal, QThread
+import time
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
+
+from engine import CheckEngine
+from writer import ResultWriter
 
 class CheckerWorker(QObject):
-    checkComplete = pyqtSignal(dict, str, str)  # website, status, status_code
-    checkError = pyqtSignal(dict, str)  # website, error_message
+    resultsPending = pyqtSignal()  # results were buffered while the buffer was empty
     allChecksComplete = pyqtSignal(int, int, float)  # total_checks, successful_checks, duration
     
-    def __init__(self, checker, config):
+    def __init__(self, checker, config, writer):
         super().__init__()
         self.checker = checker
         self.config = config
+        self.writer = writer
         self.is_running = False
         self.should_stop = False
+        self.engine = CheckEngine(checker, config)
+        self.results = []  # (website, CheckResult) not yet taken by the GUI
+        self.results_lock = threading.Lock()
     
-    def check_website(self, website):
-        if self.should_stop:
-            return
-        
-        try:
-            # Add a timeout mechanism
-            status, status_code = "Error", "Timeout"
-            
-            # Create a separate thread for the actual check
-            check_thread = threading.Thread(
-                target=self._do_check, 
-                args=(website,),
-                daemon=True
-            )
-            check_thread.start()
-            
-            # Wait for the check thread to complete with timeout
-            timeout = min(30, self.config.get('check_frequency') / 2)
-            check_thread.join(timeout)
-            
-            if check_thread.is_alive():
-                # Check timed out
-                self.checkError.emit(website, "Checker timeout")
-            elif hasattr(self, 'last_status') and hasattr(self, 'last_status_code'):
-                # Check completed successfully
-                self.checkComplete.emit(website, self.last_status, self.last_status_code)
-        except Exception as e:
-            # Handle any other errors
-            self.checkError.emit(website, f"Error checking website: {str(e)}")
-    
-    def _do_check(self, website):
-        try:
-            status, status_code = self.checker.check_website(website)
-            # Store the result to be picked up by the main method
-            self.last_status = status
-            self.last_status_code = status_code
-        except Exception as e:
-            # If any exception occurs, set error status
-            self.last_status = "Error"
-            self.last_status_code = str(e)
+    def _on_result(self, website, result):
+        # Results go straight from the engine thread to the writer queue, and
+        # are buffered for the GUI instead of crossing threads one at a time
+        self.writer.put(result)
+        with self.results_lock:
+            self.results.append((website, result))
+            first = len(self.results) == 1
+        if first:
+            self.resultsPending.emit()
+    
+    def _on_error(self, website, result):
+        self._on_result(website, result)
+    
+    def take_results(self):
+        """Everything buffered since the last call"""
+        with self.results_lock:
+            results, self.results = self.results, []
+        return results
     
     def check_all_websites(self, websites):
+        """Queue a batch of checks on the engine and return immediately.
+        
+        Signals are emitted from the engine and writer threads and reach
+        the GUI thread as queued connections. allChecksComplete waits until
+        the batch's results have been written.
+        """
         start_time = time.time()
         self.is_running = True
         self.should_stop = False
         
         total_checks = len(websites)
-        successful_checks = 0
         
-        for website in websites:
-            if self.should_stop:
-                break
-                
-            try:
-                self.check_website(website)
-                successful_checks += 1
-            except Exception as e:
-                print(f"Error checking website {website.get('name')}: {str(e)}")
+        def on_done(successful_checks):
+            duration = time.time() - start_time
+            self.is_running = bool(self.engine.batches)
+            self.writer.after_flush(
+                lambda: self.allChecksComplete.emit(total_checks, successful_checks, duration))
         
-        duration = time.time() - start_time
-        self.is_running = False
-        self.allChecksComplete.emit(total_checks, successful_checks, duration)
+        self.engine.check_batch(websites, self._on_result, self._on_error, on_done)
     
     def stop(self):
         self.should_stop = True
+        self.engine.stop()
+    
+    def shutdown(self):
+        self.should_stop = True
+        self.engine.shutdown()
 
 class ThreadedChecker(QObject):
     checkingStarted = pyqtSignal()
     checkingComplete = pyqtSignal(int, int, float)  # total, successful, duration
-    websiteChecked = pyqtSignal(dict, str, str)  # website, status, status_code
-    websiteError = pyqtSignal(dict, str)  # website, error
+    resultsChecked = pyqtSignal(list)  # [(website, CheckResult)], at most once per ui_refresh_ms
     
     def __init__(self, checker, config, database):
         super().__init__()
@@ -93,73 +80,87 @@ class ThreadedChecker(QObject):
         self.config = config
         self.database = database
         self.is_checking = False
-        self.worker = None
-        self.thread = None
+        self.active_batches = 0
+        self.pending_ids = set()  # websites queued or being checked
+        
+        # Results are written in batches off the GUI thread
+        self.writer = ResultWriter(database, config.get('write_batch_size'),
+                                   config.get('write_flush_ms') / 1000)
+        
+        # One worker (and one engine thread pool) for the lifetime of the app
+        self.worker = CheckerWorker(self.checker, self.config, self.writer)
+        self.worker.resultsPending.connect(self._on_results_pending)
+        self.worker.allChecksComplete.connect(self._on_all_checks_complete)
+        
+        # However many checks finish, the GUI gets at most one batch per interval
+        self.delivery_interval = config.get('ui_refresh_ms')
+        self.last_delivery = 0
+        self.delivery_timer = QTimer(self)
+        self.delivery_timer.setSingleShot(True)
+        self.delivery_timer.setTimerType(Qt.PreciseTimer)  # a coarse timer may fire early
+        self.delivery_timer.timeout.connect(self._deliver_results)
     
     def start_check(self, websites=None):
-        if self.is_checking:
-            print("Check already in progress, skipping...")
-            return False
+        """Start checking a batch of websites.
         
+        Batches may overlap; a website whose previous check hasn't finished
+        yet is left out rather than checked twice.
+        """
         if websites is None:
             websites = self.database.get_websites()
         
+        websites = [w for w in websites if w['id'] not in self.pending_ids]
         if not websites:
             return False
         
+        self.pending_ids.update(w['id'] for w in websites)
+        if self.active_batches == 0:
+            self.checkingStarted.emit()
+        self.active_batches += 1
         self.is_checking = True
-        self.checkingStarted.emit()
         
-        # Create worker and thread
-        self.worker = CheckerWorker(self.checker, self.config)
-        self.thread = QThread()
-        self.worker.moveToThread(self.thread)
-        
-        # Connect signals
-        self.worker.checkComplete.connect(self._on_website_checked)
-        self.worker.checkError.connect(self._on_website_error)
-        self.worker.allChecksComplete.connect(self._on_all_checks_complete)
-        self.thread.started.connect(lambda: self.worker.check_all_websites(websites))
-        self.thread.finished.connect(self.thread.deleteLater)
-        
-        # Start thread
-        self.thread.start()
+        self.worker.check_all_websites(websites)
         return True
     
     def stop_check(self):
-        if not self.is_checking or not self.worker:
+        if not self.is_checking:
             return
         
         self.worker.stop()
-        if self.thread and self.thread.isRunning():
-            self.thread.quit()
-            self.thread.wait(5000)  # Wait up to 5 seconds
-            if self.thread.isRunning():
-                self.thread.terminate()
-        
+        self.pending_ids.clear()
+        self.is_checking = False
+    
+    def flush(self, timeout=None):
+        """Write any queued results now and wait for them to be committed"""
+        return self.writer.flush(timeout)
+    
+    def shutdown(self):
+        """Cancel outstanding checks, stop the engine threads and write what's queued"""
+        self.worker.shutdown()
+        self.writer.close()
         self.is_checking = False
     
-    def _on_website_checked(self, website, status, status_code):
-        try:
-            self.database.update_website_status(website['id'], status, status_code)
-            self.websiteChecked.emit(website, status, status_code)
-        except Exception as e:
-            print(f"Error updating website status: {str(e)}")
+    def _on_results_pending(self):
+        if self.delivery_timer.isActive():
+            return
+        elapsed = (time.monotonic() - self.last_delivery) * 1000
+        self.delivery_timer.start(max(0, math.ceil(self.delivery_interval - elapsed)))
     
-    def _on_website_error(self, website, error):
-        try:
-            self.database.update_website_status(website['id'], "Error", error)
-            self.websiteError.emit(website, error)
-        except Exception as e:
-            print(f"Error updating website error: {str(e)}")
+    def _deliver_results(self):
+        self.delivery_timer.stop()
+        results = self.worker.take_results()
+        if not results:
+            return
+        self.last_delivery = time.monotonic()
+        for website, _ in results:
+            self.pending_ids.discard(website['id'])
+        self.resultsChecked.emit(results)
     
     def _on_all_checks_complete(self, total, successful, duration):
-        self.is_checking = False
-        
-        if self.thread:
-            self.thread.quit()
-            self.thread.wait(2000)
-        
+        # Hand over the batch's last results before reporting it finished
+        self._deliver_results()
+        self.active_batches -= 1
+        self.is_checking = self.active_batches > 0
         self.checkingComplete.emit(total, successful, duration)
     
     def is_running(self):
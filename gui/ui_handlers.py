@@ -1,21 +1,39 @@
-from PyQt5.QtWidgets import QTableWidgetItem, QLabel
-from PyQt5.QtGui import QPixmap, QIcon
-from PyQt5.QtCore import QTimer, QSize, Qt
+from PyQt5.QtWidgets import QLabel
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import QTimer, Qt
 from datetime import datetime
+import time
 
-from gui.utils import format_time_since, get_short_status_code
+from gui.utils import get_website_short_code
 from gui.threaded_checker import ThreadedChecker
+from scheduler import CheckScheduler
+
+def load_status_images(self):
+    """Load the red/green status images once instead of on every refresh"""
+    self.status_pixmaps = {}
+    for online, image in ((True, "assets/images/green.png"), (False, "assets/images/red.png")):
+        pixmap = QPixmap(image)
+        self.status_pixmaps[online] = (pixmap.scaled(16, 16, Qt.KeepAspectRatio),
+                                       pixmap.scaled(24, 24, Qt.KeepAspectRatio))
+    self.shown_online = None
 
 def setup_timers(self):
+    self.load_status_images()
+    
     # Timer for updating the time display - runs every second
     self.time_timer = QTimer(self)
     self.time_timer.timeout.connect(self.update_time)
     self.time_timer.start(1000)  # Update every second
     
-    # Timer for triggering website checks - runs according to config
+    # Per-site check schedule; check_frequency is the default interval
+    self.scheduler = CheckScheduler(self.config.get('check_frequency'),
+                                    self.config.get('stagger_checks'),
+                                    self.config.get('check_jitter'))
+    
+    # Timer for triggering website checks - only sites that are due get checked
     self.check_timer = QTimer(self)
-    self.check_timer.timeout.connect(self.check_websites)
-    self.check_timer.start(self.config.get('check_frequency') * 1000)
+    self.check_timer.timeout.connect(self.check_due_websites)
+    self.check_timer.start(1000)  # Look for due sites every second
     
     # Timer for updating the table UI with fresh time values
     self.update_ui_timer = QTimer(self)
@@ -27,13 +45,21 @@ def setup_timers(self):
     
     # Connect signals
     self.threaded_checker.checkingStarted.connect(self.on_checking_started)
-    self.threaded_checker.websiteChecked.connect(self.on_website_checked)
-    self.threaded_checker.websiteError.connect(self.on_website_error)
+    self.threaded_checker.resultsChecked.connect(self.on_results_checked)
     self.threaded_checker.checkingComplete.connect(self.on_checking_complete)
+    self.checks_total = self.checks_successful = 0
+    self.checks_started = time.monotonic()
+    
+    # Status report, rewritten after checks but no more than every REPORT_INTERVAL
+    self.report_timer = QTimer(self)
+    self.report_timer.setSingleShot(True)
+    self.report_timer.timeout.connect(self.write_status_report)
+    self.last_report = 0
 
     # Timer for pruning old logs - runs daily
     self.prune_timer = QTimer(self)
-    self.prune_timer.timeout.connect(lambda: self.database.prune_old_logs(30))
+    self.prune_timer.timeout.connect(lambda: self.database.prune_old_logs(
+        self.config.get('log_retention_days'), self.config.get('hourly_rollup_days')))
     self.prune_timer.start(24 * 60 * 60 * 1000)  # Run once per day
 
     # Timer for daily website backup - runs once per day
@@ -48,90 +74,71 @@ def update_time(self):
     current_time = datetime.now().strftime('%H:%M:%S')
     self.time_label.setText(current_time)
     
-    # Use the current status method instead of get_last_failure
-    current_status = self.database.get_current_status()
+    # Served from memory - no database query or image loading here
+    current_status = self.status_cache.get_current_status()
     if current_status:
         # Show info about the currently failing website
         if current_status.get('last_fail'):
-            timestamp = datetime.strptime(current_status['last_fail'], '%Y-%m-%d %H:%M:%S').strftime('%H:%M:%S')
-            failure_text = f"{timestamp} - {current_status['name']}: {get_short_status_code(current_status['status'], current_status['status_code'])}"
+            timestamp = datetime.fromtimestamp(current_status['last_fail'] / 1000).strftime('%H:%M:%S')
+            failure_text = f"{timestamp} - {current_status['name']}: {get_website_short_code(current_status)}"
             self.failure_label.setText(failure_text)
         else:
             # Fallback if last_fail is not available
-            failure_text = f"{current_status['name']}: {get_short_status_code(current_status['status'], current_status['status_code'])}"
+            failure_text = f"{current_status['name']}: {get_website_short_code(current_status)}"
             self.failure_label.setText(failure_text)
-        
-        # Update icons to red for failures
-        status_icon_pixmap = QPixmap("assets/images/red.png")
-        self.status_icon.setPixmap(status_icon_pixmap.scaled(16, 16, Qt.KeepAspectRatio))
-        self.header_status_icon.setPixmap(status_icon_pixmap.scaled(24, 24, Qt.KeepAspectRatio))
     else:
         self.failure_label.setText("Status: All Online")
-        
-        # Update icons to green for all online
-        status_icon_pixmap = QPixmap("assets/images/green.png")
-        self.status_icon.setPixmap(status_icon_pixmap.scaled(16, 16, Qt.KeepAspectRatio))
-        self.header_status_icon.setPixmap(status_icon_pixmap.scaled(24, 24, Qt.KeepAspectRatio))
+    
+    # Red icons for failures, green when all online - only swapped when that changes
+    online = current_status is None
+    if online != self.shown_online:
+        small, large = self.status_pixmaps[online]
+        self.status_icon.setPixmap(small)
+        self.header_status_icon.setPixmap(large)
+        self.shown_online = online
 
 def update_table_times(self):
-    """Update just the time columns in the table without a database query"""
+    """Repaint the time columns of the rows currently on screen"""
     if not self.websites_cache:
         return
     
-    for row, website in enumerate(self.websites_cache):
-        # Update Last Seen time
-        last_seen = format_time_since(website.get('last_seen', ''))
-        last_seen_item = QTableWidgetItem(last_seen)
-        self.table.setItem(row, 3, last_seen_item)
-        
-        # Update Last Fail time
-        last_fail = format_time_since(website.get('last_fail', ''))
-        last_fail_item = QTableWidgetItem(last_fail)
-        self.table.setItem(row, 4, last_fail_item)
+    # Rows scrolled out of view are formatted when they next get painted
+    first_row = self.table.rowAt(0)
+    last_row = self.table.rowAt(self.table.viewport().height() - 1)
+    if first_row < 0:
+        first_row = 0
+    if last_row < 0:
+        last_row = len(self.websites_cache) - 1
+    self.website_model.refresh_times(first_row, last_row)
 
 def load_websites(self):
     """Load websites from database and update the table and cache"""
     websites = self.database.get_websites()
     self.websites_cache = websites  # Update the cache
-    self.table.setRowCount(len(websites))
-    
-    for i, website in enumerate(websites):
-        self.update_table_row(i, website)
+    self.status_cache.load(websites)
+    self.scheduler.sync(websites)
+    self.website_model.set_websites(websites)
 
 def update_table_row(self, row, website):
-    status_item = QTableWidgetItem()
-    
-    # Get 3-character status code
-    short_status = get_short_status_code(website.get('status', ''), website.get('status_code', ''))
-    
-    if website.get('status') == 'OK':
-        icon = QIcon("assets/images/green.png")
-        status_item.setIcon(icon)
-        status_text = short_status
-    else:
-        icon = QIcon("assets/images/red.png")
-        status_item.setIcon(icon)
-        status_text = short_status
-    
-    # Set larger icon size (24x24 instead of 16x16)
-    self.table.setIconSize(QSize(24, 24))
-    
-    status_item.setText(status_text)
-    self.table.setItem(row, 0, status_item)
-    
-    name_item = QTableWidgetItem(website.get('name', ''))
-    self.table.setItem(row, 1, name_item)
-    
-    url_item = QTableWidgetItem(website.get('url', ''))
-    self.table.setItem(row, 2, url_item)
-    
-    # Format time-since for Last Seen
-    last_seen = format_time_since(website.get('last_seen', ''))
-    last_seen_item = QTableWidgetItem(last_seen)
-    self.table.setItem(row, 3, last_seen_item)
-    
-    # Format time-since for Last Fail
-    last_fail = format_time_since(website.get('last_fail', ''))
-    last_fail_item = QTableWidgetItem(last_fail)
-    self.table.setItem(row, 4, last_fail_item)
+    """Repaint a row after its website dict was updated in place"""
+    self.website_model.refresh_row(row)
+
+def add_website_row(self, website):
+    """Show a newly added website without reloading the table"""
+    self.status_cache.put(website)
+    self.scheduler.update(website)
+    self.website_model.add_website(website)
+
+def replace_website_row(self, website):
+    """Show an edited website without reloading the table"""
+    self.status_cache.put(website)
+    self.scheduler.update(website)
+    self.website_model.replace_website(website)
+
+def remove_website_row(self, website_id):
+    """Drop a removed website without reloading the table"""
+    self.status_cache.remove(website_id)
+    self.scheduler.remove(website_id)
+    self.website_model.remove_website(website_id)
+    self.update_time()
 
@@ -1,17 +1,18 @@
-from datetime import datetime
+import time
 
-def format_time_since(timestamp_str):
-    """Convert timestamp to human-readable time-since with max 2 significant numbers"""
-    if not timestamp_str:
+from result import Outcome, short_code
+
+def format_time_since(timestamp_ms, now_ms=None):
+    """Convert an epoch-milliseconds timestamp to human-readable time-since with max 2 significant numbers"""
+    if not timestamp_ms:
         return ""
     
     try:
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        now = datetime.now()
-        delta = now - timestamp
+        if now_ms is None:
+            now_ms = time.time() * 1000
         
         # Get total seconds
-        total_seconds = delta.total_seconds()
+        total_seconds = (now_ms - timestamp_ms) / 1000
         
         # Less than a minute
         if total_seconds < 60:
@@ -46,7 +47,7 @@ def format_time_since(timestamp_str):
         days = int((total_seconds % 31536000) / 86400)
         return f"{years}y {days}d"
     except:
-        return timestamp_str
+        return str(timestamp_ms)
 
 def get_short_status_code(status, status_code):
     """Convert status and status_code to a 3-character code"""
@@ -87,4 +88,24 @@ def get_short_status_code(status, status_code):
     if isinstance(status, str) and status:
         return status[:3].upper()
     
-    return 'UNK'  # Default for any other case
\ No newline at end of file
+    return 'UNK'  # Default for any other case
+
+def get_website_short_code(website):
+    """3-character code for a website row, from its outcome when we have one"""
+    if website.get('outcome') is not None:
+        return short_code(Outcome(website['outcome']), website.get('http_code'))
+    # Rows last checked by older versions only have the status text
+    return get_short_status_code(website.get('status', ''), website.get('status_code', ''))
+
+def format_timings(timings):
+    """Format a check's per-phase latency breakdown for a tooltip"""
+    if not timings:
+        return ""
+    
+    labels = [('dns_ms', 'DNS'), ('connect_ms', 'Connect'), ('tls_ms', 'TLS'),
+              ('ttfb_ms', 'TTFB'), ('download_ms', 'Download')]
+    parts = []
+    for field, label in labels:
+        value = timings.get(field)
+        parts.append(f"{label}: {value:.0f} ms" if value is not None else f"{label}: -")
+    return "\n".join(parts)
\ No newline at end of file
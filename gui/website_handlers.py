@@ -1,70 +1,70 @@
 import time
-from datetime import datetime
-from PyQt5.QtWidgets import QMessageBox, QFileDialog, QTableWidgetItem
+from PyQt5.QtWidgets import QMessageBox, QFileDialog
 from gui.dialogs import AddSiteDialog, SettingsDialog, AboutDialog
 
+REPORT_INTERVAL = 10  # shortest gap between status report rewrites, in seconds
+
 def check_websites(self):
-    """Perform the actual website checks"""
-    if hasattr(self, 'threaded_checker') and self.threaded_checker.is_running():
-        print("Check already in progress, skipping...")
-        return
-    
-    websites = self.database.get_websites()
+    """Check every website now, regardless of its schedule"""
+    websites = self.websites_cache
     if not websites:
         return
     
+    # Restart each site's interval from now
+    self.scheduler.sync(websites)
+    for website in websites:
+        self.scheduler.mark_checked(website['id'])
+    
     # Start a new check
     self.threaded_checker.start_check(websites)
 
+def check_due_websites(self):
+    """Check the websites whose interval has elapsed"""
+    due_websites = self.scheduler.pop_due()
+    if due_websites:
+        self.threaded_checker.start_check(due_websites)
+
 def on_checking_started(self):
-    """Handle the checking started signal"""
+    """Handle the checking started signal (sent when the first of a run of batches starts)"""
     self.checking_status_label.setText("Checking websites...")
+    self.checks_total = self.checks_successful = 0
+    self.checks_started = time.monotonic()
     
-def on_website_checked(self, website, status, status_code):
-    """Handle individual website check completion"""
-    # Find the row in the table for this website
-    for row, cached_website in enumerate(self.websites_cache):
-        if cached_website['id'] == website['id']:
-            # Update the cache
-            cached_website['status'] = status
-            cached_website['status_code'] = status_code
-            cached_website['last_check'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            if status == 'OK':
-                cached_website['last_seen'] = cached_website['last_check']
-            else:
-                cached_website['last_fail'] = cached_website['last_check']
-            
-            # Update the table row
-            self.update_table_row(row, cached_website)
-            break
-    
-    # Update status display
-    self.update_time()
-
-def on_website_error(self, website, error):
-    """Handle website check errors"""
-    # Similar to on_website_checked but for errors
-    for row, cached_website in enumerate(self.websites_cache):
-        if cached_website['id'] == website['id']:
-            cached_website['status'] = "Error"
-            cached_website['status_code'] = error
-            cached_website['last_check'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            cached_website['last_fail'] = cached_website['last_check']
-            
-            self.update_table_row(row, cached_website)
-            break
+def on_results_checked(self, results):
+    """Handle a batch of finished checks (timeouts and crashed checks included)"""
+    rows = []
+    for website, result in results:
+        # Update the cache; the table rows share the same website dicts
+        if self.status_cache.apply(result) is None:
+            continue
+        row = self.website_model.row_of(result.website_id)
+        if row is not None:
+            rows.append(row)
     
+    # One repaint and one status update per batch, however big it is
+    self.website_model.refresh_rows(rows)
     self.update_time()
 
 def on_checking_complete(self, total, successful, duration):
-    """Handle all checks complete signal"""
-    self.checking_status_label.setText(f"Check completed: {successful}/{total} successful ({duration:.2f}s)")
+    """Handle a finished batch; the status only changes once no batches are left"""
+    self.checks_total += total
+    self.checks_successful += successful
+    if self.threaded_checker.is_running():
+        return
     
-    # Generate status report file
-    self.database.generate_status_report()
+    duration = time.monotonic() - self.checks_started
+    self.checking_status_label.setText(
+        f"Check completed: {self.checks_successful}/{self.checks_total} successful ({duration:.2f}s)")
     
-    # Reload websites from the database to ensure consistency
-    self.load_websites()
+    # Due sites come in small batches every second; rewrite the report at most every REPORT_INTERVAL
+    if not self.report_timer.isActive():
+        wait = REPORT_INTERVAL - (time.monotonic() - self.last_report)
+        self.report_timer.start(max(0, int(wait * 1000)))
+
+def write_status_report(self):
+    """Generate the status report file"""
+    self.last_report = time.monotonic()
+    self.database.generate_status_report()
 
 def refresh_websites(self):
     """Manual refresh button handler"""
@@ -75,14 +75,20 @@ def add_site(self):
     if dialog.exec_():
         site_data = dialog.get_values()
         if site_data['name'] and site_data['url']:
-            self.database.add_website(site_data['name'], site_data['url'], site_data['check_string'])
-            self.load_websites()
-            self.check_websites()
+            website_id = self.database.add_website(site_data['name'], site_data['url'],
+                                                   site_data['check_string'], site_data['check_interval'])
+            if not website_id:
+                QMessageBox.warning(self, "Duplicate URL", "A website with this URL already exists.")
+                return
+            website = self.database.get_website(website_id)
+            self.add_website_row(website)
+            self.scheduler.mark_checked(website_id)
+            self.threaded_checker.start_check([website])
         else:
             QMessageBox.warning(self, "Invalid Input", "Name and URL are required.")
 
 def edit_site(self):
-    selected_rows = self.table.selectedIndexes()
+    selected_rows = self.table.selectionModel().selectedRows()
     if selected_rows:
         row = selected_rows[0].row()
         website_id = self.websites_cache[row]['id']
@@ -92,19 +98,27 @@ def edit_site(self):
         if dialog.exec_():
             site_data = dialog.get_values()
             if site_data['name'] and site_data['url']:
-                self.database.update_website(website_id, site_data['name'], site_data['url'], site_data['check_string'])
-                self.load_websites()
-                self.check_websites()
+                if not self.database.update_website(website_id, site_data['name'], site_data['url'],
+                                                    site_data['check_string'], site_data['check_interval']):
+                    QMessageBox.warning(self, "Duplicate URL", "Another website already uses this URL.")
+                    return
+                # Keep the in-memory status; the writer may not have stored it yet
+                edited = dict(self.websites_cache[row], name=site_data['name'], url=site_data['url'],
+                              check_string=site_data['check_string'],
+                              check_interval=site_data['check_interval'])
+                self.replace_website_row(edited)
+                self.scheduler.mark_checked(website_id)
+                self.threaded_checker.start_check([edited])
             else:
                 QMessageBox.warning(self, "Invalid Input", "Name and URL are required.")
     else:
         QMessageBox.information(self, "Selection Required", "Please select a website to edit.")
 
 def remove_site(self):
-    selected_rows = self.table.selectedIndexes()
+    selected_rows = self.table.selectionModel().selectedRows()
     if selected_rows:
         row = selected_rows[0].row()
-        website_id = self.database.get_websites()[row]['id']
+        website_id = self.websites_cache[row]['id']
         
         reply = QMessageBox.question(self, "Confirm Removal", 
                                    "Are you sure you want to remove this website?",
@@ -112,7 +126,7 @@ def remove_site(self):
         
         if reply == QMessageBox.Yes:
             self.database.remove_website(website_id)
-            self.load_websites()
+            self.remove_website_row(website_id)
     else:
         QMessageBox.information(self, "Selection Required", "Please select a website to remove.")
 
@@ -121,12 +135,23 @@ def import_from_csv(self):
     file_path, _ = file_dialog.getOpenFileName(self, "Select CSV File", "", "CSV Files (*.csv)")
     
     if file_path:
-        if self.database.import_from_csv(file_path):
+        reply = QMessageBox.question(self, "Existing Websites",
+                                     "Update the name and check string of websites that are already listed?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        report = self.database.import_from_csv(file_path, update_existing=reply == QMessageBox.Yes)
+        if report.inserted or report.updated:
             self.load_websites()
             self.check_websites()
-            QMessageBox.information(self, "Import Successful", "Websites imported successfully.")
+        
+        details = report.summary()
+        if report.errors:
+            details += "\n\n" + "\n".join(f"Line {line}: {message}" for line, message in report.errors[:10])
+            if report.error_count > 10:
+                details += f"\n... and {report.error_count - 10} more"
+        if report:
+            QMessageBox.information(self, "Import Complete", details)
         else:
-            QMessageBox.warning(self, "Import Failed", "Failed to import websites from CSV.")
+            QMessageBox.warning(self, "Import Failed", f"Failed to import websites from CSV: {report.failure}\n\n{details}")
 
 def export_to_csv(self):
     file_dialog = QFileDialog()
@@ -144,8 +169,9 @@ def show_settings(self):
         # Apply theme if settings were changed
         self.apply_theme()
         
-        # Update timer with new frequency
-        self.check_timer.setInterval(self.config.get('check_frequency') * 1000)
+        # Sites without their own interval use the new frequency
+        self.scheduler.set_default_interval(self.config.get('check_frequency'))
+        self.scheduler.set_dispatch(self.config.get('stagger_checks'), self.config.get('check_jitter'))
         self.check_websites()
 
 def show_about(self):
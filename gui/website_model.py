@@ -0,0 +1,118 @@
+import time
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QIcon
+
+from gui.utils import format_time_since, get_website_short_code, format_timings
+
+STATUS, NAME, URL, LAST_SEEN, LAST_FAIL = range(5)
+HEADERS = ["Status", "Name", "URL", "Last Seen", "Last Fail"]
+
+class WebsiteTableModel(QAbstractTableModel):
+    """Table model over the list of website dicts shown in the main window.
+    
+    Cell text is worked out in data(), which the view only calls for the
+    rows it is actually painting, so refreshing the relative times costs
+    the same for ten sites or ten thousand.
+    """
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.websites = []
+        self.rows = {}  # website_id -> row
+        self.now_ms = time.time() * 1000
+        self.icons = {True: QIcon("assets/images/green.png"), False: QIcon("assets/images/red.png")}
+    
+    def set_websites(self, websites):
+        """Show a new list of websites (the dicts are used as-is, not copied)"""
+        self.beginResetModel()
+        self.websites = websites
+        self.rows = {website['id']: row for row, website in enumerate(websites)}
+        self.now_ms = time.time() * 1000
+        self.endResetModel()
+    
+    def website_at(self, row):
+        return self.websites[row]
+    
+    def row_of(self, website_id):
+        """Row showing a website, or None if it isn't in the table"""
+        return self.rows.get(website_id)
+    
+    def add_website(self, website):
+        """Append a row for a new website"""
+        row = len(self.websites)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.websites.append(website)
+        self.rows[website['id']] = row
+        self.endInsertRows()
+    
+    def replace_website(self, website):
+        """Swap in a new dict for a website already in the table. Returns its row"""
+        row = self.rows.get(website['id'])
+        if row is not None:
+            self.websites[row] = website
+            self.refresh_row(row)
+        return row
+    
+    def remove_website(self, website_id):
+        row = self.rows.pop(website_id, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.websites[row]
+        # Only the rows below the removed one move up
+        for moved in range(row, len(self.websites)):
+            self.rows[self.websites[moved]['id']] = moved
+        self.endRemoveRows()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.websites)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        website = self.websites[index.row()]
+        column = index.column()
+        
+        if role == Qt.DisplayRole:
+            if column == STATUS:
+                return get_website_short_code(website)
+            if column == NAME:
+                return website.get('name', '')
+            if column == URL:
+                return website.get('url', '')
+            if column == LAST_SEEN:
+                return format_time_since(website.get('last_seen'), self.now_ms)
+            if column == LAST_FAIL:
+                return format_time_since(website.get('last_fail'), self.now_ms)
+        elif role == Qt.DecorationRole and column == STATUS:
+            return self.icons[website.get('status') == 'OK']
+        elif role == Qt.ToolTipRole and column == STATUS:
+            return format_timings(website.get('timings'))
+        return None
+    
+    def refresh_row(self, row):
+        """Repaint one row after its website dict changed"""
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(HEADERS) - 1))
+    
+    def refresh_rows(self, rows):
+        """Repaint several rows with a single dataChanged covering all of them"""
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(HEADERS) - 1))
+    
+    def refresh_times(self, first_row=0, last_row=None):
+        """Move the clock on and repaint the Last Seen/Last Fail cells of the given rows"""
+        self.now_ms = time.time() * 1000
+        if not self.websites:
+            return
+        if last_row is None or last_row >= len(self.websites):
+            last_row = len(self.websites) - 1
+        self.dataChanged.emit(self.index(first_row, LAST_SEEN), self.index(last_row, LAST_FAIL),
+                              [Qt.DisplayRole])
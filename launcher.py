@@ -17,8 +17,9 @@ logging.basicConfig(
 )
 
 class AppLauncher:
-    def __init__(self, script_path="main.py"):
+    def __init__(self, script_path="main.py", script_args=()):
         self.script_path = script_path
+        self.script_args = list(script_args)  # passed on to the script at every (re)start
         self.process = None
         self.restart_count = 0
         self.max_restarts = 5  # Maximum number of restarts in short succession
@@ -32,7 +33,7 @@ class AppLauncher:
             logging.info(f"Starting application: {self.script_path}")
             # Use Python executable from current environment
             python_exec = sys.executable
-            self.process = subprocess.Popen([python_exec, self.script_path])
+            self.process = subprocess.Popen([python_exec, self.script_path] + self.script_args)
             return True
         except Exception as e:
             logging.error(f"Failed to start application: {str(e)}")
@@ -111,5 +112,7 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, handle_signal)
     signal.signal(signal.SIGINT, handle_signal)
     
-    launcher = AppLauncher()
+    # e.g. `launcher.py daemon.py --processes 4` to supervise the headless checker
+    # instead of the GUI; arguments after the script are passed on to it
+    launcher = AppLauncher(*sys.argv[1:2], script_args=sys.argv[2:])
     launcher.monitor()
\ No newline at end of file
@@ -29,14 +29,15 @@ def main():
         should_import = True
     
     # Create database instance
-    database = Database(db_file)
+    database = Database(db_file, config.get('compact_logs'))
     
     # Import from CSV if we need to recover
     if should_import:
-        if database.import_from_csv(csv_file):
-            print("Recovery successful")
+        report = database.import_from_csv(csv_file)
+        if report:
+            print(f"Recovery successful: {report.summary()}")
         else:
-            print("Recovery failed")
+            print(f"Recovery failed: {report.failure}")
     
     checker = WebsiteChecker(config)
     main_window = MainWindow(config, database, checker)
@@ -46,6 +47,10 @@ def main():
     main_window.ui_watchdog = watchdog
     watchdog.start_monitoring()
     
+    # Release the checker's worker threads and database connections on exit
+    app.aboutToQuit.connect(main_window.threaded_checker.shutdown)
+    app.aboutToQuit.connect(database.close)
+    
     # Load websites and show window
     main_window.show()
     main_window.load_websites()
@@ -0,0 +1,485 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from result import TIMING_FIELDS
+
+# Rows touched per transaction by a backfill, so the checker is never locked
+# out for more than a moment while a big logs table is rewritten
+BACKFILL_BATCH_SIZE = 5000
+
+class Migration:
+    """One step in the schema history.
+    
+    upgrade(conn) runs inside a single transaction, which also bumps the
+    schema version. It has to be idempotent (use add_column and IF NOT
+    EXISTS), because databases from before backfills were queued may have
+    stopped half way through a step.
+    
+    If backfill is set, the step is queued in pending_backfills and
+    run_backfills() later calls backfill(conn, batch_size) -> rows changed,
+    each call in its own transaction, until it returns 0. Backfills run
+    after every upgrade, against the latest schema, and possibly while
+    checks are being written. They must only pick up rows that still need
+    converting so they can resume after an interruption.
+    """
+    
+    def __init__(self, version, description, upgrade, backfill=None):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.backfill = backfill
+
+def add_column(conn, table, name, column_type):
+    """ALTER TABLE ADD COLUMN, unless the column is already there"""
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if name not in existing:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+def create_base_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS websites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        url TEXT NOT NULL,
+        check_string TEXT,
+        last_check TIMESTAMP,
+        last_seen TIMESTAMP,
+        last_fail TIMESTAMP,
+        status TEXT,
+        status_code TEXT
+    )
+    ''')
+    
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        website_id INTEGER,
+        timestamp TIMESTAMP,
+        status TEXT,
+        status_code TEXT,
+        FOREIGN KEY (website_id) REFERENCES websites (id)
+    )
+    ''')
+
+def add_check_intervals(conn):
+    add_column(conn, 'websites', 'check_interval', 'INTEGER')
+
+def add_timing_columns(conn):
+    for field in TIMING_FIELDS:
+        add_column(conn, 'logs', field, 'REAL')
+
+def add_outcome_columns(conn):
+    add_column(conn, 'websites', 'outcome', 'INTEGER')
+    add_column(conn, 'websites', 'http_code', 'INTEGER')
+    add_column(conn, 'logs', 'outcome', 'INTEGER')
+    add_column(conn, 'logs', 'http_code', 'INTEGER')
+    add_column(conn, 'logs', 'bytes_read', 'INTEGER')
+
+def add_indexes(conn):
+    # Per-site history and remove_website
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_website_time ON logs (website_id, timestamp)')
+    # prune_old_logs
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)')
+    # get_last_failure - only failures are indexed, so it stays small
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_failures ON logs (timestamp) WHERE status != 'OK'")
+    # get_current_status
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_websites_failing ON websites (last_fail) "
+                 "WHERE status != 'OK'")
+    
+    unique_urls(conn)
+
+def unique_urls(conn):
+    """Enforce unique website URLs, unless an older database already has duplicates.
+    
+    Until the duplicates are removed URLs get a plain idx_websites_url_dup
+    index instead; Database.init_db() calls this again on every start while
+    that index exists. Returns True once URLs are unique.
+    """
+    duplicate = conn.execute('SELECT url FROM websites GROUP BY url HAVING COUNT(*) > 1 LIMIT 1').fetchone()
+    if duplicate:
+        print(f"Duplicate website URLs found (e.g. {duplicate[0]}); remove them to enforce unique URLs")
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_websites_url_dup ON websites (url)')
+        return False
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_websites_url ON websites (url)')
+    conn.execute('DROP INDEX IF EXISTS idx_websites_url_dup')
+    return True
+
+def epoch_ms_websites(conn):
+    # Local-time text, as older versions wrote it, to UTC epoch milliseconds
+    for column in ('last_check', 'last_seen', 'last_fail'):
+        conn.execute(f'''
+        UPDATE websites
+        SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER) * 1000
+        WHERE typeof({column}) = 'text'
+        ''')
+
+def epoch_ms_logs(conn, batch_size):
+    # Text sorts after every number in SQLite, so "timestamp >= ''" picks out
+    # just the unconverted rows straight from idx_logs_timestamp. Text that
+    # isn't a valid date becomes NULL rather than being picked up again.
+    return conn.execute('''
+    UPDATE logs
+    SET timestamp = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000
+    WHERE id IN (SELECT id FROM logs WHERE timestamp >= '' LIMIT ?)
+    ''', (batch_size,)).rowcount
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+
+def create_rollups(conn):
+    for table in ('rollup_hourly', 'rollup_daily'):
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            website_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            checks INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            latency_count INTEGER NOT NULL DEFAULT 0,
+            latency_sum REAL NOT NULL DEFAULT 0,
+            latency_max REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (website_id, bucket)
+        ) WITHOUT ROWID
+        ''')
+    
+    # Logs that were already there get rolled up by the backfill, up to the
+    # last row written before this migration; newer rows are rolled up as
+    # they are written
+    conn.execute('CREATE TABLE IF NOT EXISTS rollup_backfill (next_id INTEGER, end_id INTEGER)')
+    if conn.execute('SELECT COUNT(*) FROM rollup_backfill').fetchone()[0] == 0:
+        conn.execute('INSERT INTO rollup_backfill SELECT COALESCE(MIN(id), 1), COALESCE(MAX(id), 0) FROM logs')
+
+def backfill_rollups(conn, batch_size):
+    next_id, end_id = conn.execute('SELECT next_id, end_id FROM rollup_backfill').fetchone()
+    if next_id > end_id:
+        conn.execute('DROP TABLE rollup_backfill')
+        return 0
+    
+    last_id = min(next_id + batch_size - 1, end_id)
+    for table, size in (('rollup_hourly', HOUR_MS), ('rollup_daily', DAY_MS)):
+        conn.execute(f'''
+        INSERT INTO {table} (website_id, bucket, checks, failures, latency_count, latency_sum, latency_max)
+        SELECT website_id, timestamp - timestamp % {size}, COUNT(*), SUM(status != 'OK'),
+               SUM(latency IS NOT NULL), COALESCE(SUM(latency), 0), COALESCE(MAX(latency), 0)
+        FROM (
+            SELECT website_id, timestamp, status,
+                   CASE WHEN COALESCE(dns_ms, connect_ms, tls_ms, ttfb_ms, download_ms) IS NOT NULL
+                        THEN COALESCE(dns_ms, 0) + COALESCE(connect_ms, 0) + COALESCE(tls_ms, 0) +
+                             COALESCE(ttfb_ms, 0) + COALESCE(download_ms, 0)
+                   END AS latency
+            FROM logs
+            WHERE id BETWEEN ? AND ? AND typeof(timestamp) = 'integer'
+        )
+        WHERE true  -- keeps the parser from reading ON CONFLICT as a join constraint
+        GROUP BY 1, 2
+        ON CONFLICT (website_id, bucket) DO UPDATE SET
+            checks = checks + excluded.checks,
+            failures = failures + excluded.failures,
+            latency_count = latency_count + excluded.latency_count,
+            latency_sum = latency_sum + excluded.latency_sum,
+            latency_max = MAX(latency_max, excluded.latency_max)
+        ''', (next_id, last_id))
+    
+    conn.execute('UPDATE rollup_backfill SET next_id = ?', (last_id + 1,))
+    return last_id - next_id + 1
+
+def create_outages(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS outages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        website_id INTEGER NOT NULL,
+        started INTEGER NOT NULL,
+        ended INTEGER
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outages_website ON outages (website_id, started)')
+    # At most one open outage per website
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_outages_open ON outages (website_id) '
+                 'WHERE ended IS NULL')
+    
+    # Checks from the cutoff on record their outages as they come in
+    # (without logs, in compact mode), so the backfill stops there
+    conn.execute('CREATE TABLE IF NOT EXISTS outage_backfill (next_website_id INTEGER, cutoff INTEGER)')
+    if conn.execute('SELECT COUNT(*) FROM outage_backfill').fetchone()[0] == 0:
+        conn.execute('INSERT INTO outage_backfill VALUES (0, ?)', (int(time.time() * 1000),))
+
+def backfill_outages(conn, batch_size):
+    """Rebuild the outages before the cutoff from the logs of one website per call"""
+    row = conn.execute('''
+    SELECT MIN(id), (SELECT cutoff FROM outage_backfill) FROM websites
+    WHERE id >= (SELECT next_website_id FROM outage_backfill)
+    ''').fetchone()
+    if row[0] is None:
+        conn.execute('DROP TABLE outage_backfill')
+        return 0
+    
+    website_id, cutoff = row
+    conn.execute('DELETE FROM outages WHERE website_id = ? AND started < ?', (website_id, cutoff))
+    
+    # Only the checks where the site went down or came back up, as seen
+    # by each probe (NULL for local checks)
+    transitions = conn.execute('''
+    SELECT probe_id, timestamp, ok FROM (
+        SELECT probe_id, timestamp, status = 'OK' AS ok,
+               LAG(status = 'OK') OVER (PARTITION BY probe_id ORDER BY timestamp) AS previous
+        FROM logs
+        WHERE website_id = ? AND timestamp < ?
+    )
+    WHERE previous IS NULL OR ok != previous
+    ORDER BY probe_id, timestamp
+    ''', (website_id, cutoff)).fetchall()
+    
+    started = {}  # probe_id -> start of its open outage
+    for probe_id, timestamp, ok in transitions:
+        if not ok and probe_id not in started:
+            started[probe_id] = timestamp
+        elif ok and probe_id in started:
+            conn.execute('INSERT INTO outages (website_id, probe_id, started, ended) VALUES (?, ?, ?, ?)',
+                         (website_id, probe_id, started.pop(probe_id), timestamp))
+    for probe_id, timestamp in started.items():
+        join_cutoff_outage(conn, website_id, probe_id, timestamp, cutoff)
+    
+    conn.execute('UPDATE outage_backfill SET next_website_id = ?', (website_id + 1,))
+    return 1 + len(transitions)
+
+def join_cutoff_outage(conn, website_id, probe_id, started, cutoff):
+    """Store an outage that was still open at the backfill cutoff.
+    
+    It carries on into the first outage recorded after the cutoff, unless a
+    successful check in the logs or status runs shows the site came back up
+    first; then it ends there. With neither it is left open.
+    """
+    up = conn.execute('''
+    SELECT MIN(up) FROM (
+        SELECT MIN(timestamp) AS up FROM logs
+        WHERE website_id = ? AND probe_id IS ? AND timestamp >= ? AND status = 'OK'
+        UNION ALL
+        SELECT MIN(first_check) FROM status_runs
+        WHERE website_id = ? AND probe_id IS ? AND first_check >= ? AND status = 'OK'
+    )
+    ''', (website_id, probe_id, cutoff) * 2).fetchone()[0]
+    later = conn.execute('''
+    SELECT id, started FROM outages WHERE website_id = ? AND probe_id IS ? AND started >= ?
+    ORDER BY started LIMIT 1
+    ''', (website_id, probe_id, cutoff)).fetchone()
+    
+    if later is not None and (up is None or later[1] < up):
+        conn.execute('UPDATE outages SET started = ? WHERE id = ?', (started, later[0]))
+    else:
+        conn.execute('INSERT INTO outages (website_id, probe_id, started, ended) VALUES (?, ?, ?, ?)',
+                     (website_id, probe_id, started, up))
+
+def create_status_runs(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS status_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        website_id INTEGER NOT NULL,
+        status TEXT,
+        status_code TEXT,
+        outcome INTEGER,
+        http_code INTEGER,
+        first_check INTEGER NOT NULL,
+        last_check INTEGER NOT NULL,
+        checks INTEGER NOT NULL,
+        latency_count INTEGER NOT NULL DEFAULT 0,
+        latency_min REAL,
+        latency_max REAL,
+        latency_sum REAL NOT NULL DEFAULT 0
+    )
+    ''')
+    # A site's current run is the one with the highest id
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_status_runs_website ON status_runs (website_id, id)')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status_runs_failures ON status_runs (last_check) "
+                 "WHERE status != 'OK'")
+
+def add_probe_columns(conn):
+    add_column(conn, 'logs', 'probe_id', 'TEXT')
+    add_column(conn, 'status_runs', 'probe_id', 'TEXT')
+    # Each probe has its own current run per site
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_status_runs_probe ON status_runs (website_id, probe_id, id)')
+
+def add_outage_probe(conn):
+    add_column(conn, 'outages', 'probe_id', 'TEXT')
+    # At most one open outage per website and probe; NULLs never clash in a
+    # unique index, so local checks are keyed by '' instead
+    conn.execute('DROP INDEX IF EXISTS idx_outages_open')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_outages_probe_open "
+                 "ON outages (website_id, IFNULL(probe_id, '')) WHERE ended IS NULL")
+
+def add_first_check(conn):
+    add_column(conn, 'websites', 'first_check', 'INTEGER')
+    # Oldest converted log or status run of each site; "< ''" leaves out text
+    # timestamps and lets MIN() read the first entry of idx_logs_website_time
+    conn.execute('''
+    UPDATE websites
+    SET first_check = (
+        SELECT MIN(first) FROM (
+            SELECT MIN(timestamp) AS first FROM logs WHERE website_id = websites.id AND timestamp < ''
+            UNION ALL
+            SELECT MIN(first_check) FROM status_runs WHERE website_id = websites.id
+        )
+    )
+    WHERE first_check IS NULL
+    ''')
+
+# Ordered by version; never edit a migration that has shipped, add a new one
+MIGRATIONS = [
+    Migration(1, 'Base websites and logs tables', create_base_schema),
+    Migration(2, 'Per-site check intervals', add_check_intervals),
+    Migration(3, 'Per-phase check timings', add_timing_columns),
+    Migration(4, 'Check outcome, HTTP code and bytes read', add_outcome_columns),
+    Migration(5, 'Indexes for log queries and unique website URLs', add_indexes),
+    Migration(6, 'Timestamps as UTC epoch milliseconds', epoch_ms_websites, epoch_ms_logs),
+    Migration(7, 'Hourly and daily uptime rollups', create_rollups, backfill_rollups),
+    Migration(8, 'Outage intervals for SLA reporting', create_outages, backfill_outages),
+    Migration(9, 'Run-length status history for compact logging', create_status_runs),
+    Migration(10, 'Probe id on logs and status runs', add_probe_columns),
+    Migration(11, 'Outages tracked per probe', add_outage_probe),
+    Migration(12, 'Time of each website\'s first check for SLA windows', add_first_check),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def pending_migrations(conn):
+    version = get_version(conn)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+def pending_backfills(conn):
+    """Migrations whose backfill hasn't finished yet, in the order they have to run"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'pending_backfills'").fetchone() is None:
+        return []
+    versions = {row[0] for row in conn.execute('SELECT version FROM pending_backfills')}
+    return [migration for migration in MIGRATIONS if migration.version in versions]
+
+def migrate(conn, batch_size=BACKFILL_BATCH_SIZE, verbose=False, backfill=True):
+    """Bring the database up to LATEST_VERSION.
+    
+    With backfill=False only the schema changes are made and data
+    conversions are left queued for run_backfills(), which is how the app
+    starts up quickly on a big database.
+    
+    Returns a list of (migration, seconds) for the steps that were applied,
+    followed by the backfills that were run.
+    """
+    applied = []
+    for migration in pending_migrations(conn):
+        start = time.perf_counter()
+        apply_migration(conn, migration)
+        elapsed = time.perf_counter() - start
+        applied.append((migration, elapsed))
+        if verbose:
+            print(f"Migration {migration.version} ({migration.description}): {elapsed:.2f}s")
+    if backfill:
+        applied += run_backfills(conn, batch_size, verbose=verbose)
+    return applied
+
+def apply_migration(conn, migration):
+    """Make a step's schema change and queue its backfill, if it has one"""
+    conn.execute('BEGIN')
+    try:
+        migration.upgrade(conn)
+        if migration.backfill is not None:
+            conn.execute('CREATE TABLE IF NOT EXISTS pending_backfills (version INTEGER PRIMARY KEY)')
+            conn.execute('INSERT OR IGNORE INTO pending_backfills VALUES (?)', (migration.version,))
+        conn.execute(f'PRAGMA user_version = {int(migration.version)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def run_backfills(conn, batch_size=BACKFILL_BATCH_SIZE, stop_event=None, pause=0, verbose=False):
+    """Run the queued backfills in order, one batch per transaction.
+    
+    Waits pause seconds between batches so other writers get a turn, and
+    returns early once stop_event is set; the rest is picked up by the next
+    call. Returns a list of (migration, seconds) for the finished backfills.
+    """
+    finished = []
+    for migration in pending_backfills(conn):
+        start = time.perf_counter()
+        total = 0
+        while True:
+            if stop_event is not None and stop_event.wait(pause):
+                return finished
+            # IMMEDIATE takes the write lock up front; a backfill reads before it
+            # writes and would otherwise fail if the result writer got in between
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                changed = migration.backfill(conn, batch_size)
+                if not changed:
+                    conn.execute('DELETE FROM pending_backfills WHERE version = ?', (migration.version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if not changed:
+                break
+            total += changed
+            if verbose:
+                print(f"  migration {migration.version}: {total} rows converted")
+        elapsed = time.perf_counter() - start
+        finished.append((migration, elapsed))
+        if verbose:
+            print(f"Backfill {migration.version} ({migration.description}): {elapsed:.2f}s")
+    return finished
+
+def dry_run(db_file, batch_size=BACKFILL_BATCH_SIZE):
+    """Time the pending migrations on a copy of db_file, leaving it untouched.
+    
+    Returns a list of (migration, seconds).
+    """
+    source = sqlite3.connect(db_file)
+    handle, copy_file = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        copy = sqlite3.connect(copy_file)
+        source.backup(copy)
+        source.close()
+        try:
+            return migrate(copy, batch_size, verbose=True)
+        finally:
+            copy.close()
+    finally:
+        os.remove(copy_file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Upgrade a Webby database to the current schema')
+    parser.add_argument('db_file', nargs='?', default='uptime.db')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='time the migrations on a copy of the database without changing it')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                        help='rows converted per transaction by data migrations')
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(args.db_file):
+        print(f"Database file not found: {args.db_file}")
+        return 1
+    
+    conn = sqlite3.connect(args.db_file)
+    version = get_version(conn)
+    pending = pending_migrations(conn)
+    backfills = pending_backfills(conn)
+    print(f"Schema version {version}, latest {LATEST_VERSION}, {len(pending)} migration(s) pending, "
+          f"{len(backfills)} unfinished backfill(s)")
+    if not pending and not backfills:
+        conn.close()
+        return 0
+    
+    start = time.perf_counter()
+    if args.dry_run:
+        conn.close()
+        dry_run(args.db_file, args.batch_size)
+    else:
+        migrate(conn, args.batch_size, verbose=True)
+        conn.close()
+    print(f"Total: {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
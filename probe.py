@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# probe.py - check websites from another machine and report to a collector
+import argparse
+import collections
+import hmac
+import json
+import logging
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+from config import Config
+from result import CheckResult, Outcome, TIMING_FIELDS
+from shards import check_loop, shard_of
+
+# Frames are a 4-byte big-endian length followed by that much UTF-8 JSON
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME = 16 * 1024 * 1024
+MAX_BUFFERED = 100000  # results kept while the collector is unreachable; oldest dropped first
+WEBSITE_FIELDS = ('id', 'name', 'url', 'check_string', 'check_interval')
+
+def send_frame(sock, message):
+    data = json.dumps(message, separators=(',', ':')).encode()
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+def recv_frame(sock):
+    (size,) = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"frame of {size} bytes is too large")
+    return json.loads(recv_exactly(sock, size))
+
+def encode_result(result):
+    """A CheckResult as a flat list; field names aren't repeated for every check"""
+    return [result.website_id, int(result.outcome), result.http_code, result.error,
+            result.timestamp, result.bytes_read] + [getattr(result, field) for field in TIMING_FIELDS]
+
+def decode_result(row, probe_id):
+    website_id, outcome, http_code, error, timestamp, bytes_read = row[:6]
+    result = CheckResult(website_id, Outcome(outcome), http_code, error, timestamp)
+    result.bytes_read = bytes_read
+    result.probe_id = probe_id
+    for field, value in zip(TIMING_FIELDS, row[6:]):
+        setattr(result, field, value)
+    return result
+
+def parse_address(text, default_host='127.0.0.1'):
+    """'host:port' or ':port' -> (host, port)"""
+    host, _, port = text.rpartition(':')
+    return host or default_host, int(port)
+
+class Probe:
+    """Checks a share of the collector's websites and streams the results back.
+    
+    The collector sends the website list when the probe connects and again
+    whenever it changes; the probe schedules and checks its share with the
+    same check loop as a daemon worker process. Results are sent in batches
+    of up to batch_size every flush_interval seconds, and kept (up to
+    MAX_BUFFERED) while the collector can't be reached.
+    """
+    
+    def __init__(self, config, address, probe_id, shard=0, shards=1, token='',
+                 batch_size=200, flush_interval=0.5):
+        self.config = config
+        self.address = address
+        self.probe_id = probe_id
+        self.shard = shard
+        self.shards = shards
+        self.token = token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.commands = queue.Queue()  # for check_loop
+        self.buffer = collections.deque(maxlen=MAX_BUFFERED)  # encoded results not sent yet
+        self.buffer_lock = threading.Lock()
+        self.stopped = threading.Event()
+    
+    def put(self, message):
+        """Called by check_loop from the engine thread"""
+        kind, payload = message
+        if kind == 'result':
+            with self.buffer_lock:
+                self.buffer.append(encode_result(payload[1]))
+    
+    def take_batch(self):
+        with self.buffer_lock:
+            return [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+    
+    def put_back(self, batch):
+        with self.buffer_lock:
+            self.buffer.extendleft(reversed(batch))
+    
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=10)
+        send_frame(sock, {'type': 'hello', 'probe': self.probe_id, 'token': self.token,
+                          'shard': self.shard, 'shards': self.shards})
+        reply = recv_frame(sock)
+        if reply.get('type') == 'error':
+            sock.close()
+            raise PermissionError(reply.get('error'))
+        self.commands.put(('websites', reply['websites']))
+        sock.settimeout(None)
+        return sock
+    
+    def read_updates(self, sock):
+        """Pass website list updates from the collector on to the check loop"""
+        try:
+            while True:
+                message = recv_frame(sock)
+                if message.get('type') == 'websites':
+                    self.commands.put(('websites', message['websites']))
+        except (OSError, ValueError):
+            pass
+    
+    def send_results(self, sock, reader):
+        """Send batches until the connection breaks or the probe stops"""
+        while True:
+            stopping = self.stopped.wait(self.flush_interval)
+            if not reader.is_alive():
+                raise ConnectionError("collector closed the connection")
+            batch = self.take_batch()
+            while batch:
+                try:
+                    send_frame(sock, {'type': 'results', 'results': batch})
+                except OSError:
+                    self.put_back(batch)
+                    raise
+                batch = self.take_batch() if len(batch) == self.batch_size else []
+            if stopping:
+                return
+    
+    def connection_loop(self):
+        delay = 1
+        while not self.stopped.is_set():
+            try:
+                sock = self.connect()
+            except PermissionError as e:
+                logging.error(f"Collector refused probe {self.probe_id}: {e}")
+                self.commands.put(('stop', None))
+                return
+            except (OSError, ValueError) as e:
+                logging.warning(f"Can't reach collector at {self.address[0]}:{self.address[1]}: {e}")
+                self.stopped.wait(delay)
+                delay = min(delay * 2, 60)
+                continue
+            
+            logging.info(f"Connected to collector at {self.address[0]}:{self.address[1]}")
+            delay = 1
+            reader = threading.Thread(target=self.read_updates, args=(sock,), daemon=True)
+            reader.start()
+            try:
+                self.send_results(sock, reader)
+            except OSError as e:
+                logging.warning(f"Lost connection to collector: {e}")
+            finally:
+                sock.close()
+    
+    def handle_signal(self, sig, frame):
+        logging.info(f"Received signal {sig}, shutting down")
+        self.commands.put(('stop', None))
+    
+    def run(self):
+        sender = threading.Thread(target=self.connection_loop, name='webby-probe-sender')
+        sender.start()
+        try:
+            check_loop(self.shard, self.config, self.commands, self)
+        finally:
+            # Send what's left, then disconnect
+            self.stopped.set()
+            sender.join(10)
+        logging.info("Stopped")
+        return 0
+
+class SiteQuorum:
+    """Decides a website's state when several sources check it.
+    
+    Sources are the local checks (probe_id None) and each probe. A source's
+    latest result for a site is its vote, and the site only changes state
+    when a strict majority of the sources checking it agree; a tie keeps the
+    current state. apply() clears sets_site_state on results that disagree
+    with the outcome, so they are stored for their own source only.
+    With a single source every result sets the state, as before.
+    """
+    
+    def __init__(self):
+        self.votes = {}  # website_id -> {probe_id: ok}
+        self.states = {}  # website_id -> ok
+        self.lock = threading.Lock()
+    
+    def apply(self, result):
+        """Count a result's vote and mark whether it sets its website's state"""
+        with self.lock:
+            votes = self.votes.setdefault(result.website_id, {})
+            votes[result.probe_id] = result.ok
+            up = sum(votes.values())
+            down = len(votes) - up
+            if up != down:
+                state = up > down
+            else:
+                state = self.states.get(result.website_id, result.ok)
+            self.states[result.website_id] = state
+        result.sets_site_state = result.ok == state
+        return result
+    
+    def forget(self, probe_id):
+        """Drop the votes of a source that went away"""
+        with self.lock:
+            for votes in self.votes.values():
+                votes.pop(probe_id, None)
+
+class Collector:
+    """Accepts probe connections and feeds their results into this process.
+    
+    Every probe gets the websites of its shard (all of them for a probe with
+    one shard, so several probes can check the same sites). Results arrive
+    tagged with the probe's id and are passed to on_result(website, result)
+    from the connection's thread. on_disconnect(probe_id), if given, is
+    called when a probe goes away.
+    """
+    
+    def __init__(self, address, on_result, token='', on_disconnect=None):
+        self.address = address
+        self.on_result = on_result
+        self.on_disconnect = on_disconnect
+        self.token = token
+        self.websites = {}  # website_id -> website dict
+        self.probes = {}  # connection handler -> (probe_id, shard, shards)
+        self.lock = threading.Lock()
+        self.server = None
+    
+    def start(self):
+        collector = self
+        
+        class Handler(socketserver.BaseRequestHandler):
+            def setup(self):
+                self.send_lock = threading.Lock()
+            
+            def handle(self):
+                collector.handle_probe(self)
+        
+        self.server = socketserver.ThreadingTCPServer(self.address, Handler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.address = self.server.server_address  # the real port when 0 was asked for
+        threading.Thread(target=self.server.serve_forever, name='webby-collector', daemon=True).start()
+        logging.info(f"Collecting probe results on {self.address[0]}:{self.address[1]}")
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            with self.lock:
+                handlers = list(self.probes)
+            for handler in handlers:
+                try:
+                    handler.request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+    
+    def share(self, shard, shards):
+        with self.lock:
+            websites = list(self.websites.values())
+        return [{field: website.get(field) for field in WEBSITE_FIELDS}
+                for website in websites if shard_of(website['id'], shards) == shard]
+    
+    def send(self, handler, message):
+        with handler.send_lock:
+            send_frame(handler.request, message)
+    
+    def assign(self, websites):
+        """Update the website list and pass each connected probe its new share"""
+        with self.lock:
+            self.websites = {website['id']: website for website in websites}
+            probes = list(self.probes.items())
+        for handler, (_, shard, shards) in probes:
+            try:
+                self.send(handler, {'type': 'websites', 'websites': self.share(shard, shards)})
+            except OSError:
+                pass  # its handler thread notices and drops it
+    
+    def handle_probe(self, handler):
+        sock = handler.request
+        sock.settimeout(30)
+        try:
+            hello = recv_frame(sock)
+            probe_id = str(hello.get('probe') or '')
+            shards = max(1, int(hello.get('shards') or 1))
+            shard = int(hello.get('shard') or 0) % shards
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Bad hello from {handler.client_address[0]}: {e}")
+            return
+        
+        if not probe_id or not hmac.compare_digest(str(hello.get('token') or ''), self.token):
+            logging.warning(f"Rejected probe {probe_id!r} from {handler.client_address[0]}")
+            try:
+                self.send(handler, {'type': 'error', 'error': 'unknown probe or bad token'})
+            except OSError:
+                pass
+            return
+        
+        with self.lock:
+            self.probes[handler] = (probe_id, shard, shards)
+        logging.info(f"Probe {probe_id} connected from {handler.client_address[0]} "
+                     f"(shard {shard + 1} of {shards})")
+        try:
+            self.send(handler, {'type': 'websites', 'websites': self.share(shard, shards)})
+            sock.settimeout(None)
+            while True:
+                message = recv_frame(sock)
+                if message.get('type') != 'results':
+                    continue
+                for row in message['results']:
+                    result = decode_result(row, probe_id)
+                    website = self.websites.get(result.website_id)
+                    if website is not None:  # removed since the probe was told about it
+                        self.on_result(website, result)
+        except (OSError, ValueError) as e:
+            logging.info(f"Probe {probe_id} disconnected: {e}")
+        finally:
+            with self.lock:
+                self.probes.pop(handler, None)
+                connected = any(probe[0] == probe_id for probe in self.probes.values())
+            if self.on_disconnect and not connected:
+                self.on_disconnect(probe_id)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check websites for a collector (a daemon started with --listen).")
+    parser.add_argument('collector', help="collector address, host:port")
+    parser.add_argument('--id', required=True, help="name this probe's results are stored under")
+    parser.add_argument('--shard', default='1/1',
+                        help="check only this slice of the websites, e.g. 2/3 (default: all)")
+    parser.add_argument('--token', help="shared secret (default: probe_token setting)")
+    parser.add_argument('--config', default='config.json', help="config file (default: config.json)")
+    parser.add_argument('--log-file', help="log here instead of to stderr")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        filename=args.log_file
+    )
+    
+    shard, _, shards = args.shard.partition('/')
+    shard, shards = int(shard), int(shards or 1)
+    if not 1 <= shard <= shards:
+        parser.error(f"--shard {args.shard}: expected N/M with 1 <= N <= M")
+    
+    config = Config(args.config)
+    token = args.token if args.token is not None else config.get('probe_token')
+    probe = Probe(config, parse_address(args.collector), args.id, shard - 1, shards, token,
+                  config.get('write_batch_size'), config.get('write_flush_ms') / 1000)
+    signal.signal(signal.SIGTERM, probe.handle_signal)
+    signal.signal(signal.SIGINT, probe.handle_signal)
+    return probe.run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import enum
+import time
+
+# Per-check latency breakdown, in milliseconds
+TIMING_FIELDS = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'download_ms')
+
+class Outcome(enum.IntEnum):
+    OK = 0
+    DNS = 1
+    SSL = 2
+    HTTP = 3
+    STRING = 4
+    TIMEOUT = 5
+    ERROR = 6
+
+# Status text stored in the websites/logs tables, as older versions wrote it
+STATUS_TEXT = {
+    Outcome.OK: 'OK',
+    Outcome.DNS: 'DNS',
+    Outcome.SSL: 'SSL',
+    Outcome.HTTP: 'HTTP',
+    Outcome.STRING: 'String',
+    Outcome.TIMEOUT: 'Error',
+    Outcome.ERROR: 'Error',
+}
+
+SHORT_CODES = {
+    Outcome.DNS: 'DNS',
+    Outcome.SSL: 'SSL',
+    Outcome.STRING: 'STR',
+    Outcome.TIMEOUT: 'TMO',
+    Outcome.ERROR: 'ERR',
+}
+
+def short_code(outcome, http_code):
+    """3-character code shown in the status column"""
+    if outcome == Outcome.OK:
+        return str(http_code) if http_code else '200'
+    if outcome == Outcome.HTTP:
+        return str(http_code) if http_code else 'HTT'
+    return SHORT_CODES.get(outcome, 'UNK')
+
+class CheckResult:
+    """Outcome of one website check.
+    
+    Slotted so thousands of in-flight results stay small. The checker fills
+    in the timing fields and bytes_read as each phase runs.
+    """
+    
+    __slots__ = ('website_id', 'outcome', 'http_code', 'error', 'timestamp',
+                 'bytes_read', 'probe_id', 'sets_site_state') + TIMING_FIELDS
+    
+    def __init__(self, website_id, outcome=Outcome.OK, http_code=0, error=None, timestamp=None):
+        self.website_id = website_id
+        self.outcome = outcome
+        self.http_code = http_code  # 0 when no HTTP response was received
+        self.error = error  # short description of what went wrong, None when OK
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.bytes_read = 0
+        self.probe_id = None  # remote probe that ran the check, None when checked locally
+        # False when other sources outvote this check; it is then only recorded for its own source
+        self.sets_site_state = True
+        self.dns_ms = None
+        self.connect_ms = None
+        self.tls_ms = None
+        self.ttfb_ms = None
+        self.download_ms = None
+    
+    @property
+    def ok(self):
+        return self.outcome == Outcome.OK
+    
+    @property
+    def status(self):
+        return STATUS_TEXT[self.outcome]
+    
+    @property
+    def status_code(self):
+        """Status code text as stored in the database"""
+        if self.error:
+            return self.error
+        return str(self.http_code) if self.http_code else ''
+    
+    @property
+    def timestamp_ms(self):
+        """When the check finished, in UTC epoch milliseconds as stored in the database"""
+        return int(self.timestamp * 1000)
+    
+    @property
+    def total_ms(self):
+        """Sum of all phases that ran, or None if none did"""
+        phases = [getattr(self, field) for field in TIMING_FIELDS]
+        phases = [value for value in phases if value is not None]
+        return sum(phases) if phases else None
+    
+    def short_code(self):
+        return short_code(self.outcome, self.http_code)
+    
+    def timings(self):
+        return {field: getattr(self, field) for field in TIMING_FIELDS}
+    
+    def add_timing(self, field, seconds):
+        """Add a phase duration, given in seconds"""
+        value = getattr(self, field)
+        setattr(self, field, (value or 0) + seconds * 1000)
+    
+    def __repr__(self):
+        return (f"CheckResult(website_id={self.website_id!r}, outcome={self.outcome.name}, "
+                f"http_code={self.http_code}, error={self.error!r})")
@@ -0,0 +1,161 @@
+import heapq
+import math
+import random
+import time
+import zlib
+
+class CheckScheduler:
+    """Decides which websites are due for a check.
+    
+    Each website has its own interval (websites.check_interval, falling back
+    to the global check_frequency). Next-due times live in a min-heap, so a
+    tick only looks at the sites that are actually due instead of walking the
+    whole list.
+    
+    With stagger enabled every site is pinned to a fixed slot inside its
+    interval, derived from a hash of its id, so checks are spread evenly
+    instead of all firing together. jitter (a fraction of the interval)
+    delays each check by a random amount on top of its slot.
+    """
+    
+    def __init__(self, default_interval, stagger=False, jitter=0.0):
+        self.default_interval = default_interval
+        self.stagger = stagger
+        self.jitter = jitter
+        self.heap = []  # (due, website_id)
+        self.entries = {}  # website_id -> [due, website]
+    
+    def get_interval(self, website):
+        return website.get('check_interval') or self.default_interval
+    
+    def set_default_interval(self, seconds):
+        self.default_interval = seconds
+    
+    def set_dispatch(self, stagger, jitter=0.0):
+        """Switch between staggered and all-at-once dispatch"""
+        self.stagger = stagger
+        self.jitter = jitter
+    
+    def get_offset(self, website):
+        """Stable position of a website inside its interval, in seconds"""
+        fraction = zlib.crc32(str(website['id']).encode()) / 2**32
+        return fraction * self.get_interval(website)
+    
+    def next_due_after(self, website, now):
+        """When a website should next be checked, counting from now"""
+        interval = self.get_interval(website)
+        if not self.stagger:
+            return now + interval
+        
+        # Next slot strictly after now on this site's fixed grid. Jitter only
+        # ever delays, so a check never lands back in the slot it just used.
+        offset = self.get_offset(website)
+        due = (math.floor((now - offset) / interval) + 1) * interval + offset
+        if self.jitter:
+            due += random.uniform(0, min(self.jitter, 0.5)) * interval
+        return due
+    
+    def schedule(self, website, due):
+        """(Re)schedule a website; any older heap entry for it goes stale"""
+        self.entries[website['id']] = [due, website]
+        heapq.heappush(self.heap, (due, website['id']))
+    
+    def remove(self, website_id):
+        # The heap entry is skipped lazily once it reaches the top
+        self.entries.pop(website_id, None)
+    
+    def update(self, website, now=None):
+        """Add a new website or pick up edits to a known one.
+        
+        New websites are due immediately, or with stagger at their next slot
+        (which is within one interval), so a restart doesn't check the whole
+        list at once.
+        """
+        if now is None:
+            now = time.time()
+        
+        entry = self.entries.get(website['id'])
+        if entry is None:
+            if self.stagger:
+                # Its next slot, so load is flat from the start
+                self.schedule(website, self.next_due_after(website, now))
+            else:
+                self.schedule(website, now)
+        elif self.get_interval(website) != self.get_interval(entry[1]):
+            # Interval was edited - don't make a site wait out its old interval
+            self.schedule(website, min(entry[0], self.next_due_after(website, now)))
+        else:
+            entry[1] = website
+    
+    def sync(self, websites, now=None):
+        """Bring the schedule in line with the current list of websites.
+        
+        New websites are added as in update(), known ones keep their due
+        time, and websites that no longer exist are dropped.
+        """
+        if now is None:
+            now = time.time()
+        
+        current_ids = set()
+        for website in websites:
+            current_ids.add(website['id'])
+            self.update(website, now)
+        
+        for website_id in list(self.entries):
+            if website_id not in current_ids:
+                self.remove(website_id)
+        
+        # Don't let stale entries pile up forever
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(due, website_id) for website_id, (due, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+    
+    def pop_due(self, now=None):
+        """Return the websites that are due and schedule their next check"""
+        if now is None:
+            now = time.time()
+        
+        due_websites = []
+        while self.heap and self.heap[0][0] <= now:
+            due, website_id = heapq.heappop(self.heap)
+            entry = self.entries.get(website_id)
+            if entry is None or entry[0] != due:
+                continue  # stale entry
+            
+            website = entry[1]
+            due_websites.append(website)
+            
+            if self.stagger:
+                next_due = self.next_due_after(website, now)
+            else:
+                next_due = due + self.get_interval(website)
+                if next_due <= now:
+                    # We fell behind (e.g. the machine was asleep) - don't try to catch up
+                    next_due = now + self.get_interval(website)
+            self.schedule(website, next_due)
+        
+        return due_websites
+    
+    def mark_checked(self, website_id, now=None):
+        """Restart a website's interval after an out-of-schedule check"""
+        entry = self.entries.get(website_id)
+        if entry is None:
+            return
+        if now is None:
+            now = time.time()
+        if self.stagger:
+            # Skip a slot that is about to come up so the site isn't checked twice in a row
+            now += self.get_interval(entry[1]) / 2
+        self.schedule(entry[1], self.next_due_after(entry[1], now))
+    
+    def seconds_until_next(self, now=None):
+        """Seconds until the next website is due, or None if nothing is scheduled"""
+        if now is None:
+            now = time.time()
+        while self.heap:
+            due, website_id = self.heap[0]
+            entry = self.entries.get(website_id)
+            if entry is not None and entry[0] == due:
+                return max(0, due - now)
+            heapq.heappop(self.heap)
+        return None
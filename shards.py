@@ -0,0 +1,125 @@
+import multiprocessing
+import queue
+import signal
+import threading
+import zlib
+
+def shard_of(website_id, shards):
+    """Stable shard number for a website; the same id always lands on the same shard"""
+    return zlib.crc32(f"shard:{website_id}".encode()) % shards
+
+def run_shard(shard, config, commands, results):
+    """Entry point of a worker process; see check_loop"""
+    # The parent decides when workers stop; Ctrl-C reaches the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    check_loop(shard, config, commands, results)
+
+def check_loop(shard, config, commands, results):
+    """Check a share of the websites until told to stop.
+    
+    Runs its own engine, scheduler and connection pools and never touches
+    the database: every result is handed to results.put().
+    
+    commands carries ('websites', list), ('once', list) and ('stop', None);
+    results gets ('result', (website, CheckResult)) per check and
+    ('done', shard) when a one-off batch has finished.
+    """
+    from checker import WebsiteChecker
+    from engine import CheckEngine
+    from scheduler import CheckScheduler
+    
+    engine = CheckEngine(WebsiteChecker(config), config)
+    scheduler = CheckScheduler(config.get('check_frequency'),
+                               config.get('stagger_checks'),
+                               config.get('check_jitter'))
+    pending_ids = set()
+    pending_lock = threading.Lock()
+    
+    def on_result(website, result):
+        with pending_lock:
+            pending_ids.discard(website['id'])
+        results.put(('result', (website, result)))
+    
+    def start_check(websites, on_done=None):
+        with pending_lock:
+            websites = [w for w in websites if w['id'] not in pending_ids]
+            pending_ids.update(w['id'] for w in websites)
+        engine.check_batch(websites, on_result, on_result, on_done)
+    
+    try:
+        while True:
+            timeout = scheduler.seconds_until_next()
+            timeout = 1 if timeout is None else min(max(timeout, 0.05), 1)
+            try:
+                command, payload = commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+            
+            if command == 'stop':
+                break
+            elif command == 'websites':
+                scheduler.sync(payload)
+            elif command == 'once':
+                start_check(payload, lambda successful_checks: results.put(('done', shard)))
+            
+            due_websites = scheduler.pop_due()
+            if due_websites:
+                start_check(due_websites)
+    finally:
+        engine.shutdown()
+
+class ShardPool:
+    """Spreads checks over worker processes, one per shard.
+    
+    Websites are split by shard_of(), so each one is always checked by the
+    same process and its connections stay in that process's pools. Results
+    come back on a single queue for the parent, which is the only process
+    that writes to the database.
+    """
+    
+    def __init__(self, config, shards):
+        self.config = config
+        self.shards = shards
+        # spawn, not fork: children must not inherit open SQLite handles or threads
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue()
+        self.commands = []
+        self.processes = []
+    
+    def start(self):
+        for shard in range(self.shards):
+            commands = self.context.Queue()
+            process = self.context.Process(target=run_shard,
+                                           args=(shard, self.config, commands, self.results),
+                                           name=f'webby-shard-{shard}', daemon=True)
+            process.start()
+            self.commands.append(commands)
+            self.processes.append(process)
+    
+    def split(self, websites):
+        shares = [[] for _ in range(self.shards)]
+        for website in websites:
+            shares[shard_of(website['id'], self.shards)].append(website)
+        return shares
+    
+    def assign(self, websites):
+        """Give every worker its current share of the websites to schedule"""
+        for commands, share in zip(self.commands, self.split(websites)):
+            commands.put(('websites', share))
+    
+    def check_once(self, websites):
+        """Check every website a single time. Returns how many 'done' messages to expect"""
+        for commands, share in zip(self.commands, self.split(websites)):
+            commands.put(('once', share))
+        return self.shards
+    
+    def stop(self, timeout=10):
+        for commands in self.commands:
+            commands.put(('stop', None))
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+class StatusCache:
+    """Current status of every website, kept in memory.
+    
+    Loaded once from the database and then updated from the stream of check
+    results, so the UI can show the current state without querying SQLite.
+    Failing sites are kept in order of their last failure, which makes the
+    most recently failing site an O(1) lookup.
+    """
+    
+    def __init__(self):
+        self.sites = {}  # website_id -> website dict
+        self.failing = OrderedDict()  # website_id -> None, oldest failure first
+    
+    def load(self, websites):
+        """Replace the cache with freshly loaded website rows (the dicts are kept, not copied)"""
+        self.sites = {website['id']: website for website in websites}
+        failing = [website for website in websites if is_failing(website)]
+        failing.sort(key=lambda website: website.get('last_fail') or 0)
+        self.failing = OrderedDict((website['id'], None) for website in failing)
+    
+    def get(self, website_id):
+        return self.sites.get(website_id)
+    
+    def put(self, website):
+        """Add a website, or replace the cached dict of an edited one"""
+        self.sites[website['id']] = website
+        if not is_failing(website):
+            self.failing.pop(website['id'], None)
+        elif website['id'] not in self.failing:
+            self.failing[website['id']] = None
+    
+    def apply(self, result):
+        """Record a CheckResult. Returns the updated website dict, or None if it's unknown"""
+        website = self.sites.get(result.website_id)
+        if website is None:
+            return None
+        
+        now = result.timestamp_ms
+        website['status'] = result.status
+        website['status_code'] = result.status_code
+        website['outcome'] = int(result.outcome)
+        website['http_code'] = result.http_code
+        website['timings'] = result.timings()
+        website['last_check'] = now
+        if result.ok:
+            website['last_seen'] = now
+            self.failing.pop(result.website_id, None)
+        else:
+            website['last_fail'] = now
+            self.failing[result.website_id] = None
+            self.failing.move_to_end(result.website_id)
+        return website
+    
+    def remove(self, website_id):
+        self.sites.pop(website_id, None)
+        self.failing.pop(website_id, None)
+    
+    def get_current_status(self):
+        """The most recently failing website, or None if everything is up"""
+        if not self.failing:
+            return None
+        return self.sites[next(reversed(self.failing))]
+
+def is_failing(website):
+    # Same rule as Database.get_current_status: never-checked sites don't count
+    return website.get('status') is not None and website.get('status') != 'OK'
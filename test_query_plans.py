@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import Database
+
+class QueryPlanTest(unittest.TestCase):
+    """Checks that the hot queries are answered from their indexes.
+    
+    Every statement a Database method runs is captured with the SQLite trace
+    callback and explained with EXPLAIN QUERY PLAN, so the test follows the
+    real SQL instead of a copy of it.
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = Database(os.path.join(self.directory, 'uptime.db'))
+        self.conn = self.database.get_connection()
+    
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.directory)
+    
+    def query_plans(self, method, *args):
+        """Run a Database method; returns the query plan of each statement it ran"""
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        try:
+            method(*args)
+        finally:
+            self.conn.set_trace_callback(None)
+        
+        plans = []
+        for sql in statements:
+            if sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                rows = self.conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+                plans.append(' | '.join(row[3] for row in rows))
+        return plans
+    
+    def assertUsesIndex(self, index, plans):
+        self.assertTrue(any(index in plan for plan in plans),
+                        f"{index} not used by any of: {plans}")
+    
+    def test_last_failure_uses_failures_index(self):
+        self.assertUsesIndex('idx_logs_failures', self.query_plans(self.database.get_last_failure))
+    
+    def test_prune_uses_timestamp_index(self):
+        self.assertUsesIndex('idx_logs_timestamp', self.query_plans(self.database.prune_old_logs, 7))
+    
+    def test_remove_website_uses_website_time_index(self):
+        self.assertUsesIndex('idx_logs_website_time', self.query_plans(self.database.remove_website, 1))
+    
+    def test_current_status_uses_failing_index(self):
+        self.assertUsesIndex('idx_websites_failing', self.query_plans(self.database.get_current_status))
+
+if __name__ == '__main__':
+    unittest.main()
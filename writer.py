@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+
+# Queued to make the writer thread write what it has and exit
+_STOP = object()
+
+class ResultWriter:
+    """Writes check results to the database from a background thread.
+    
+    Results are queued as they come in and written in one transaction per
+    batch: as soon as batch_size results are waiting, or flush_interval
+    seconds after the first result of a batch arrived, whichever is first.
+    A full check cycle costs a handful of commits instead of one per site.
+    """
+    
+    def __init__(self, database, batch_size=200, flush_interval=0.5):
+        self.database = database
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='webby-writer', daemon=True)
+                self.thread.start()
+    
+    def put(self, result):
+        """Queue a CheckResult for writing"""
+        self.start()
+        self.queue.put(result)
+    
+    def after_flush(self, callback):
+        """Call callback once everything queued so far has been committed.
+        
+        The callback runs on the writer thread.
+        """
+        self.start()
+        self.queue.put(callback)
+    
+    def flush(self, timeout=None):
+        """Write everything queued so far and wait for the commit.
+        
+        Returns False if the writer didn't finish within timeout seconds.
+        """
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        self.after_flush(done.set)
+        return done.wait(timeout)
+    
+    def close(self, timeout=5):
+        """Write whatever is still queued and stop the writer thread"""
+        with self._lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join(timeout)
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # flush interval is up
+            
+            if item is not None and item is not _STOP and not callable(item):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            
+            # Batch is full, its time is up, a flush was asked for, or we're stopping
+            self._write(batch)
+            batch = []
+            deadline = None
+            
+            if item is _STOP:
+                return
+            if callable(item):
+                try:
+                    item()
+                except Exception as e:
+                    print(f"Error after flushing results: {str(e)}")
+    
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.database.write_results(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} check results: {str(e)}")